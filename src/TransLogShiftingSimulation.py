@@ -2,9 +2,12 @@ import os
 import pandas as pd
 import datetime
 import numpy as np
-from itertools import compress
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import heapq
 import matplotlib.pyplot as plt
 from math import floor
+from types import MappingProxyType
 
 # change the origin file for your workstation
 origin = 'your origin directory'
@@ -13,26 +16,33 @@ origin = 'your origin directory'
 class PM():
        """
        This is a PM class.
-       It holds the values each PM requires for tracking and diagnostics
+       It holds the values each PM requires for tracking and diagnostics.
+       Its trips are recorded only through FleetState.depart, depart_many and arrive; trips_count and
+       work_log are read only snapshots of them.
        
        input:        where the pm starts from (tuas/city)
                      which hours this pm works for
                      which shift this pm works, for convenience sake
        """
-       def __init__(self, index, starting_location, working_hours, work_shift):
+       # half-hourly calendars of when a PM is able to work, shared by the PMs with the same
+       # (work shift, working hours, meal hour)
+       work_calendars = {}
+
+       def __init__(self, index, starting_location, working_hours, work_shift, fleet = None, slot = 0):
+              # the state of the PM lives in its slot of the fleet state. a PM on its own gets a fleet of 1
+              self.fleet = fleet if fleet is not None else FleetState(1)
+              self.slot = slot
               self.index = index # identity of PM
               self.origin = starting_location 
               self.location = starting_location
               self.current_dest = None # where the PM is heading towards while on transit
               self.trips_count = {'full': 0, # trip count for type
                                   'half': 0,
-                                  'empty': 0,
-                                  'dest': []} # trip count for destination
+                                  'empty': 0}
               self.working_hours = working_hours # which hours
               self.work_shift = work_shift # which shift
-              self.work_log = {'depart': [], # to track when it departs for transport
-                               'arrive': [], # and when it arrives at location
-                               'container': []} # to track which PM took which container
+              # when it departs, arrives and which container it took are kept in the trip log of the fleet (see work_log)
+              self.epoch = None # the timings in the work log are minutes after this (set by the simulation)
               self.meal_shift_d = '000000'
               self.work_shift_meal_times = {'7m': {'0': 11, '1': 12},
                                             '7n': {'0': 1, '1': 2},
@@ -41,6 +51,70 @@ class PM():
                                             '9m': 12,
                                             '9n': 2}
               self.work_shift_meal_times['7m'], self.work_shift_meal_times['7n'] = self.work_shift_meal_times['7m'][self.meal_shift_d[0]], self.work_shift_meal_times['7n'][self.meal_shift_d[1]]
+              self.update_work_calendar()
+       
+       @property
+       def location(self):
+              return FleetState.locations[self.fleet.location[self.slot]]
+
+       @location.setter
+       def location(self, location):
+              self.fleet.location[self.slot] = FleetState.location_codes[location]
+
+       @property
+       def current_dest(self):
+              dest = self.fleet.dest[self.slot]
+              return None if dest == FleetState.NOWHERE else FleetState.locations[dest]
+
+       @current_dest.setter
+       def current_dest(self, dest):
+              self.fleet.dest[self.slot] = FleetState.NOWHERE if dest is None else FleetState.location_codes[dest]
+
+       @property
+       def work_shift(self):
+              return FleetState.shifts[self.fleet.shift[self.slot]]
+
+       @work_shift.setter
+       def work_shift(self, shift):
+              self.fleet.shift[self.slot] = FleetState.shift_codes[shift]
+
+       # the trip counts and work log are read only snapshots; trips are recorded through FleetState.depart, 
+       # depart_many and arrive
+       @property
+       def trips_count(self):
+              trips = self.fleet.trips[self.slot]
+              counts = {trip_type: int(trips[code]) for trip_type, code in FleetState.trip_types.items()}
+              counts['dest'] = tuple(FleetState.locations[x] for x in self.fleet.history(self.slot)['dest'])
+              return MappingProxyType(counts)
+
+       @trips_count.setter
+       def trips_count(self, counts):
+              # only the counts can be set; the destinations come from the trip log
+              if set(counts) - set(FleetState.trip_types):
+                     raise ValueError('only the full, half and empty trip counts can be set, not ' + str(sorted(set(counts) - set(FleetState.trip_types))))
+              for trip_type, code in FleetState.trip_types.items():
+                     self.fleet.trips[self.slot, code] = counts[trip_type]
+
+       @property
+       def work_log(self):
+              history = self.fleet.history(self.slot)
+              empty = FleetState.trip_types['empty']
+              container = []
+              for trip_type, container_1, container_2 in zip(history['trip_type'].tolist(), history['container_1'].tolist(), history['container_2'].tolist()):
+                     if trip_type == empty:
+                            container.append('empty' + str(container_1) + '|' + str(container_2))
+                     elif container_2 == TripLog.NO_CONTAINER:
+                            container.append(container_1)
+                     else:
+                            container.append((container_1, container_2))
+              return MappingProxyType({'depart': tuple(history['depart'].tolist()), # to track when it departs for transport
+                                       'arrive': tuple(x for x in history['arrive'].tolist() if x != TripLog.NO_TIME), # and when it arrives at location
+                                       'container': tuple(container)}) # to track which PM took which container
+
+       @property
+       def last_depart(self):
+              timing = self.fleet.last_depart[self.slot]
+              return None if timing == FleetState.NO_TIME else int(timing)
        
        def get_hours(self, timedelta):
               """
@@ -53,6 +127,22 @@ class PM():
               result = int(result*(10**2))/(10**2)
               return result
        
+       def to_datetime(self, timing):
+              """
+              function:     to convert a timing in the work log back into a datetime
+              input:        minutes since the epoch of the simulation
+              returns:      datetime value
+              """
+              return self.epoch + datetime.timedelta(minutes = int(timing))
+
+       def work_log_times(self, log):
+              """
+              function:     the departure or arrival timings of the work log as datetimes
+              input:        'depart' or 'arrive'
+              returns:      list of datetime values
+              """
+              return [self.to_datetime(x) for x in self.work_log[log]]
+
        def flatten(self, container):
               """
               function:     to flatten a nested list into a list
@@ -73,6 +163,7 @@ class PM():
               output:       None. Will update the working hours of the PM
               """
               self.working_hours = hours
+              self.update_work_calendar()
               
        def set_work_shift(self, shift):
               """
@@ -81,6 +172,37 @@ class PM():
               output:       None. But will update the work shift
               """
               self.work_shift = shift
+              self.update_work_calendar()
+
+       def get_slot(self, time):
+              """
+              function:     to get the half hour slot of the day that a timing falls in
+              input:        a timing; datetime value
+              output:       slot number, from 0 (00:00 - 00:29) to 47 (23:30 - 23:59)
+              """
+              return time.hour*2 + (time.minute >= 30)
+
+       def update_work_calendar(self):
+              """
+              function:     works out which half hour slots of the day the PM is able to work in, based on its 
+                            work shift, working hours and meal hour. PMs with the same profile share the calendar
+              input:        None
+              output:       None. Updates the work calendar of the PM
+              """
+              wsml = self.work_shift_meal_times[self.work_shift]
+              self.work_profile = (self.work_shift, tuple(self.working_hours), wsml)
+              if self.work_profile not in PM.work_calendars:
+                     calendar = np.zeros(48, dtype = bool)
+                     for slot in range(48):
+                            # hours are counted from the half hour
+                            current_hour = slot // 2 if slot % 2 == 1 else (slot // 2 - 1) % 24
+                            # make sure there's a 2 hour gap before they panggang
+                            if self.working_hours[current_hour] == 1 and self.working_hours[(current_hour + 1) % 24] == 1 and self.working_hours[(current_hour + 2) % 24] == 1:
+                                   # 1 hour gap before they go off for lunch
+                                   if current_hour != wsml and self.working_hours[(wsml + 1) % 24] == 1:
+                                          calendar[slot] = True
+                     PM.work_calendars[self.work_profile] = calendar
+              self.work_calendar = PM.work_calendars[self.work_profile]
 
        def able_to_work(self, time):
               """
@@ -88,21 +210,7 @@ class PM():
               input:        a timing; datetime value
               output:       boolean
               """
-              current_time = time.time()
-              current_hour = current_time.hour
-              current_minute = current_time.minute
-              if current_minute < 30:
-                     current_hour -= 1
-                     if current_hour == -1:
-                            current_hour = 23
-              
-              wsml = self.work_shift_meal_times[self.work_shift]
-              # make sure there's a 2 hour gap before they panggang
-              if self.working_hours[current_hour] == 1 and self.working_hours[(current_hour + 1) % 24] == 1 and self.working_hours[(current_hour + 2) % 24] == 1:
-                     # 1 hour gap before they go off for lunch
-                     if current_hour != wsml and self.working_hours[(wsml + 1) % 24] == 1:
-                            return True
-              return False
+              return bool(self.work_calendar[self.get_slot(time)])
 
        def reset_tracking(self):
               """
@@ -110,13 +218,7 @@ class PM():
               input:        None
               return:       None. Just resets tracking
               """
-              self.trips_count = {'full': 0,
-                                  'half': 0,
-                                  'empty': 0,
-                                  'dest': []}
-              self.work_log = {'depart': [],
-                               'arrive': [],
-                               'container': []}
+              self.fleet.reset_trips(self.slot)
 
        def reset_working_hours(self):
               """
@@ -132,6 +234,7 @@ class PM():
                              '9n': [1]*9 + [0]*12 + [1]*3}
 
               self.working_hours = work_shifts[self.work_shift]
+              self.update_work_calendar()
 
        def reset_location(self):
               """
@@ -153,7 +256,8 @@ class PM():
                      text_file = open('PM_' + str(self.index) + '\'s Empty Movements.txt', 'w')
 
               # the indexes of all empty trips from the PMs work log
-              empty_trip_index = [i for i, v in enumerate(self.work_log['container']) if 'empty' in v]
+              empty_trip_index = np.flatnonzero(self.fleet.history(self.slot)['trip_type'] == FleetState.trip_types['empty']).tolist()
+              depart, arrive = self.work_log_times('depart'), self.work_log_times('arrive')
               duration_out = 0 # to collate the total duration taken for all empty trips
               count = len(empty_trip_index)
               print('No. of Empty Trips:', count)
@@ -162,10 +266,10 @@ class PM():
                      text_file.writelines(['No. of Empty Trips: ', str(count),
                                            '\nTime Stamps of Empty Movement:'])
               for i in empty_trip_index:
-                     duration_out += (self.work_log['arrive'][i] - self.work_log['depart'][i]).total_seconds()
-                     print('Depart:', self.work_log['depart'][i], '\tArrive:', self.work_log['arrive'][i])
+                     duration_out += (arrive[i] - depart[i]).total_seconds()
+                     print('Depart:', depart[i], '\tArrive:', arrive[i])
                      if export:
-                            text_file.writelines(['\nDepart: ', str(self.work_log['depart'][i]), '\tArrive: ',str(self.work_log['arrive'][i])])
+                            text_file.writelines(['\nDepart: ', str(depart[i]), '\tArrive: ',str(arrive[i])])
               print('\nDuration of Empty Movement:\n')
               print(int((duration_out*100)/(60**2))/100, 'hours') # 2 d.p in hours
               if export:
@@ -181,20 +285,19 @@ class PM():
               output:       idle timings
               """
               idle_timings = []
-              if len(self.work_log['arrive']) == 0:
-                     if len(self.work_log['depart']) == 0:
+              a = self.work_log_times('arrive')
+              d = self.work_log_times('depart')
+              if len(a) == 0:
+                     if len(d) == 0:
                             return None
                      else:
-                            idle_timings.append([datetime.datetime(self.work_log['depart'][0].date().year, 
-                                                      self.work_log['depart'][0].date().month, 
-                                                      self.work_log['depart'][0].date().day, 
+                            idle_timings.append([datetime.datetime(d[0].date().year, 
+                                                      d[0].date().month, 
+                                                      d[0].date().day, 
                                                       7, 
                                                       30, 
-                                                      00), self.work_log['depart'][0]])
+                                                      00), d[0]])
                             return idle_timings
-              
-              a = self.work_log['arrive'].copy()
-              d = self.work_log['depart'].copy()
 
               curr_day = datetime.datetime(d[0].year, d[0].month, d[0].day)
               last_day = datetime.datetime(a[-1].year, a[-1].month, a[-1].day)
@@ -248,7 +351,10 @@ class PM():
               input:        nothing
               output:       a list of indexes
               """
-              return [x for x in self.flatten(self.work_log['container']) if type(x) != str] # list(filter(lambda x: type(x) != str, flatten(self.work_log['container'])))
+              history = self.fleet.history(self.slot)
+              history = history[history['trip_type'] != FleetState.trip_types['empty']]
+              containers = np.column_stack([history['container_1'], history['container_2']]).ravel()
+              return containers[containers != TripLog.NO_CONTAINER].tolist()
 
        def retrieve_on_road_timings(self):
               """
@@ -257,8 +363,8 @@ class PM():
               input:        nothing
               output:       start and end time on the road
               """
-              depart = [i + datetime.timedelta(minutes = 15) for i in self.work_log['depart']] # because 0.25 hours spent on mounting
-              arrive = [i - datetime.timedelta(minutes = 15) for i in self.work_log['arrive']] # because 0.25 hours spent on offload
+              depart = [i + datetime.timedelta(minutes = 15) for i in self.work_log_times('depart')] # because 0.25 hours spent on mounting
+              arrive = [i - datetime.timedelta(minutes = 15) for i in self.work_log_times('arrive')] # because 0.25 hours spent on offload
               if len(depart) == len(arrive):
                      for i in range(len(arrive)):
                             print('Depart:', depart[i], '\tArrive:', arrive[i])
@@ -318,6 +424,535 @@ class PM():
                            '\nMounting/Offload:\t', total_mount_time + total_offload_time, 'hours')
               return [total_idle, total_meal_time, total_on_road, total_mount_time, total_offload_time]
 
+# Trip Log Class
+class TripLog():
+       """
+       This is the log of every trip made by a fleet of PMs, one row per trip in the order of departure.
+       It's append only and kept in chunks of typed arrays, so it never has to be copied as it grows.
+       An empty trip carries no container; its container columns hold the two numbers of its label
+       instead ('empty' + container_1 + '|' + container_2).
+       """
+       CHUNK = 4096 # rows per chunk
+       dtype = np.dtype([('pm', 'i4'), # slot of the PM in the fleet
+                         ('depart', 'i8'), # minutes since the epoch
+                         ('arrive', 'i8'), # minutes since the epoch, NO_TIME while on the road
+                         ('trip_type', 'i1'), # code of FleetState.trip_types
+                         ('dest', 'i1'), # code of FleetState.locations
+                         ('container_1', 'i8'), # index of the container (wrt to the dataframe)
+                         ('container_2', 'i8')]) # index of the container it's paired with, if any
+       NO_TIME = -1
+       NO_CONTAINER = -1
+
+       def __init__(self):
+              self.chunks = []
+              self.size = 0
+
+       def __len__(self):
+              return self.size
+
+       def append(self, pm, depart, trip_type, dest, container_1 = -1, container_2 = -1):
+              """
+              function:     logs a PM departing
+              input:        slot of the PM, departure time, codes of the trip type and destination, and
+                            the container(s) it carries
+              output:       row of the trip in the log
+              """
+              row = self.size
+              if row % self.CHUNK == 0:
+                     self.chunks.append(np.empty(self.CHUNK, dtype = self.dtype))
+              self.chunks[-1][row % self.CHUNK] = (pm, depart, self.NO_TIME, trip_type, dest, container_1, container_2)
+              self.size += 1
+              return row
+
+       def set_arrive(self, row, timing):
+              """
+              function:     logs the arrival of a trip
+              input:        row of the trip and the arrival time
+              output:       None. Updates the log
+              """
+              self.chunks[row // self.CHUNK]['arrive'][row % self.CHUNK] = timing
+
+       def records(self):
+              """
+              function:     the whole log as one structured array
+              input:        None
+              output:       structured array of the trips, in the order of departure
+              """
+              if not self.chunks:
+                     return np.empty(0, dtype = self.dtype)
+              return np.concatenate(self.chunks)[:self.size]
+
+       def take(self, rows):
+              """
+              function:     gathers some of the trips of the log, without putting the whole log together
+              input:        rows of the log
+              output:       structured array of those trips, in the order of the rows
+              """
+              rows = np.asarray(rows, dtype = np.int64)
+              trips = np.empty(len(rows), dtype = self.dtype)
+              chunk, offset = np.divmod(rows, self.CHUNK)
+              for c in np.unique(chunk).tolist():
+                     in_chunk = chunk == c
+                     trips[in_chunk] = self.chunks[c][offset[in_chunk]]
+              return trips
+
+       def save(self, file):
+              """
+              function:     writes the whole log to disk in one go
+              input:        file name or file object
+              output:       None. Saves the log as a .npy file
+              """
+              np.save(file, self.records())
+
+# Fleet State Class
+class FleetState():
+       """
+       This is the state of a whole fleet of PMs, kept as parallel arrays indexed by the PM's slot
+       (PM_1 is slot 0), so that fleet wide queries are vector operations.
+       The PM objects are views over their slot of the fleet state.
+       
+       input:        number of PMs in the fleet
+       """
+       locations = ['city', 'tuas', 'transit']
+       location_codes = {'city': 0, 'tuas': 1, 'transit': 2}
+       trip_types = {'full': 0, 'half': 1, 'empty': 2}
+       shifts = ['7m', '7n', '8m', '8n', '9m', '9n']
+       shift_codes = {'7m': 0, '7n': 1, '8m': 2, '8n': 3, '9m': 4, '9n': 5}
+       NOWHERE = -1 # destination of a PM that's not on the road
+       NO_TIME = -1 # last depart of a PM that hasn't departed
+
+       def __init__(self, size):
+              self.size = size
+              self.location = np.zeros(size, dtype = np.int8) # code of where the PM is (city/tuas/transit)
+              self.dest = np.full(size, self.NOWHERE, dtype = np.int8) # code of where the PM is heading towards
+              self.shift = np.zeros(size, dtype = np.int8) # code of the work shift
+              self.trips = np.zeros((size, len(self.trip_types)), dtype = np.int32) # trip count per type (full, half, empty)
+              self.departs = np.zeros(size, dtype = np.int32) # how many times the PM has departed
+              self.last_depart = np.full(size, self.NO_TIME, dtype = np.int64) # minutes since the epoch
+              self.trip_log = TripLog() # every trip made by the fleet
+              self.last_trip = np.full(size, -1, dtype = np.int64) # row of the latest trip of the PM in the trip log
+              self.trip_rows = [[] for _ in range(size)] # rows of the trip log that make up each PM's history
+              self.logging = True # whether the trips are written into the trip log
+
+       def __len__(self):
+              return self.size
+
+       def depart(self, slot, dest, trip_type, timing, container_1 = -1, container_2 = -1):
+              """
+              function:     records a PM leaving for a location
+              input:        slot of the PM, where it's headed, type of trip (full, half, empty), the 
+                            departure time (minutes since the epoch) and the container(s) it carries
+              output:       None. Updates the fleet state and the trip log
+              """
+              dest_code, trip_code = self.location_codes[dest], self.trip_types[trip_type]
+              self.location[slot] = 2
+              self.dest[slot] = dest_code
+              self.trips[slot, trip_code] += 1
+              self.departs[slot] += 1
+              self.last_depart[slot] = timing
+              if self.logging:
+                     row = self.trip_log.append(slot, timing, trip_code, dest_code, container_1, container_2)
+                     self.last_trip[slot] = row
+                     self.trip_rows[slot].append(row)
+
+       def depart_many(self, slots, dest, trip_type, timing, loads):
+              """
+              function:     records a number of PMs leaving for the same location at the same time
+              input:        slots of the PMs, where they're headed, type of trip (full, half, empty), the 
+                            departure time (minutes since the epoch) and the (container_1, container_2) each one carries
+              output:       None. Updates the fleet state and the trip log
+              """
+              dest_code, trip_code = self.location_codes[dest], self.trip_types[trip_type]
+              slots = np.asarray(slots)
+              self.location[slots] = 2
+              self.dest[slots] = dest_code
+              self.trips[slots, trip_code] += 1
+              self.departs[slots] += 1
+              self.last_depart[slots] = timing
+              if self.logging:
+                     for slot, (container_1, container_2) in zip(slots.tolist(), loads):
+                            row = self.trip_log.append(slot, timing, trip_code, dest_code, container_1, container_2)
+                            self.last_trip[slot] = row
+                            self.trip_rows[slot].append(row)
+
+       def arrive(self, slot, timing):
+              """
+              function:     records a PM arriving at where it was heading towards
+              input:        slot of the PM and the arrival time (minutes since the epoch)
+              output:       None. Updates the fleet state and the trip log
+              """
+              self.location[slot] = self.dest[slot]
+              self.dest[slot] = self.NOWHERE
+              if self.logging:
+                     self.trip_log.set_arrive(self.last_trip[slot], timing)
+
+       def reset_trips(self, slot):
+              """
+              function:     starts the trip counts and history of a PM afresh. its earlier trips stay in the log
+              input:        slot of the PM
+              output:       None. Updates the fleet state
+              """
+              self.trips[slot] = 0
+              self.departs[slot] = 0
+              self.last_depart[slot] = self.NO_TIME
+              self.trip_rows[slot] = []
+
+       def history(self, slot):
+              """
+              function:     the trips made by a PM
+              input:        slot of the PM
+              output:       structured array of its rows of the trip log, in the order of departure
+              """
+              return self.trip_log.take(self.trip_rows[slot])
+
+       def on_shift(self, shift):
+              """
+              function:     the slots of the PMs working a shift
+              input:        which shift
+              output:       array of slots
+              """
+              return np.flatnonzero(self.shift == self.shift_codes[shift])
+
+# Back Log Queue Class
+class BackLogQueue():
+       """
+       This is a priority queue for the containers in the back log.
+       The connection time remaining of a container is connect_time - (now - DISC_DT), so ordering
+       the containers by their deadline (DISC_DT + connect_time) gives the same order at any point
+       in time. The queue is kept sorted by (deadline, index) so it never has to be re-sorted.
+       The deadline is exact (nanoseconds), so containers whose connection time remaining is within
+       0.01 hours (36 seconds) of each other go by their deadline, and not by index as they did when
+       the back log was sorted on the rounded hours.
+       """
+       def __init__(self):
+              self.queue = []
+
+       def __len__(self):
+              return len(self.queue)
+
+       def push(self, deadline, index):
+              """
+              function:     adds a container to the queue
+              input:        deadline of the container and its index (wrt to the dataframe)
+              output:       None. Updates the queue
+              """
+              insort(self.queue, (deadline, index))
+
+       def remove(self, deadline, index):
+              """
+              function:     removes a container from the queue
+              input:        deadline of the container and its index (wrt to the dataframe)
+              output:       None. Updates the queue
+              """
+              position = bisect_left(self.queue, (deadline, index))
+              if position < len(self.queue) and self.queue[position][1] == index:
+                     del self.queue[position]
+
+       def entries(self):
+              """
+              function:     a snapshot of the queue, so that it can be iterated over while being updated
+              input:        None
+              output:       list of (deadline, index) from the shortest to the longest connection time remaining
+              """
+              return list(self.queue)
+
+       def indexes(self):
+              """
+              function:     a snapshot of the container indexes in the queue
+              input:        None
+              output:       list of indexes from the shortest to the longest connection time remaining
+              """
+              return [index for _, index in self.queue]
+
+# Event Queue Class
+class EventQueue():
+       """
+       This is the queue of events for the event engine of the simulation; the discharges of the observations,
+       the arrivals of the PMs and the boundaries of the half hour slots where PMs go on or off work.
+       Events come out in the order of their timing and, at the same timing, arrivals first, then boundaries,
+       then discharges (the same order the per observation engine sees them in).
+       """
+       ARRIVAL, BOUNDARY, DISCHARGE = 0, 1, 2
+
+       def __init__(self):
+              self.queue = []
+              self.count = 0 # to keep events of the same kind and timing in the order they were added
+
+       def __len__(self):
+              return len(self.queue)
+
+       def push(self, timing, kind, data = None):
+              """
+              function:     adds an event to the queue
+              input:        timing of the event (minutes since the epoch), its kind and what it's about (the 
+                            index of the observation for discharges)
+              output:       None. Updates the queue
+              """
+              heapq.heappush(self.queue, (int(timing), kind, self.count, data))
+              self.count += 1
+
+       def pop(self):
+              """
+              function:     takes the next event off the queue
+              input:        None
+              output:       (timing, kind, data) of the event
+              """
+              timing, kind, _, data = heapq.heappop(self.queue)
+              return timing, kind, data
+
+# Track Buffer Class
+class TrackBuffer():
+       """
+       This is a series of counts tracked once per iteration of the simulation, in a preallocated int32 array.
+       The series can be restarted from its latest value (after the initialisation iterations), and view()
+       gives the values since then without copying them.
+       
+       input:        the most number of values it'll hold
+       """
+       def __init__(self, size = 0):
+              self.values = np.zeros(size, dtype = np.int32)
+              self.start = 0
+              self.end = 0
+
+       def __len__(self):
+              return self.end - self.start
+
+       def __iter__(self):
+              return iter(self.view().tolist())
+
+       def __getitem__(self, key):
+              return self.view()[key]
+
+       def __array__(self, dtype = None, copy = None):
+              return self.view() if dtype is None else self.view().astype(dtype)
+
+       def append(self, value, timing = None):
+              """
+              function:     adds the value of the current iteration
+              input:        count, and the timing of the iteration (not needed here, see BucketTrack)
+              output:       None. Updates the series
+              """
+              if self.end == len(self.values):
+                     self.values = np.concatenate([self.values, np.zeros(max(len(self.values), 1), dtype = np.int32)])
+              self.values[self.end] = value
+              self.end += 1
+
+       def restart(self):
+              """
+              function:     starts the series afresh from its latest value
+              input:        None
+              output:       None. Updates the series
+              """
+              self.start = max(self.end - 1, 0)
+
+       def view(self):
+              """
+              function:     the values since the series was last restarted
+              input:        None
+              output:       int32 array (a view into the buffer)
+              """
+              return self.values[self.start:self.end]
+
+       def mean(self):
+              """
+              function:     average of the values since the series was last restarted
+              input:        None
+              output:       float
+              """
+              return np.mean(self.view())
+
+       def max(self):
+              """
+              function:     largest of the values since the series was last restarted
+              input:        None
+              output:       int
+              """
+              return self.view().max()
+
+# Bucket Track Class
+class BucketTrack():
+       """
+       This is a series of counts tracked once per iteration of the simulation, aggregated into buckets of a 
+       fixed length of DISC_DT. Each bucket keeps the number, sum, min and max of the values that fell in it,
+       so the memory it takes depends on the time horizon and not on the number of observations.
+       Its interface is the same as TrackBuffer's, with view() giving the mean of each bucket.
+       
+       input:        timing of the first and last iteration (minutes since the epoch) and the bucket length in minutes
+       """
+       def __init__(self, first, last, width):
+              self.first = first
+              self.width = width
+              size = max((last - first) // width + 1, 0)
+              self.count = np.zeros(size, dtype = np.int32)
+              self.total = np.zeros(size, dtype = np.int64)
+              self.low = np.full(size, np.iinfo(np.int32).max, dtype = np.int32)
+              self.high = np.full(size, np.iinfo(np.int32).min, dtype = np.int32)
+              self.start = 0 # first bucket since the series was last restarted
+              self.latest = None # (bucket, value) that was added last
+
+       def __len__(self):
+              return 0 if self.latest is None else self.latest[0] - self.start + 1
+
+       def __iter__(self):
+              return iter(self.view().tolist())
+
+       def __getitem__(self, key):
+              return self.view()[key]
+
+       def __array__(self, dtype = None, copy = None):
+              return self.view() if dtype is None else self.view().astype(dtype)
+
+       def append(self, value, timing):
+              """
+              function:     adds the value of the current iteration to the bucket its timing falls in
+              input:        count and the timing of the iteration (minutes since the epoch)
+              output:       None. Updates the series
+              """
+              bucket = (timing - self.first) // self.width
+              self.count[bucket] += 1
+              self.total[bucket] += value
+              if value < self.low[bucket]:
+                     self.low[bucket] = value
+              if value > self.high[bucket]:
+                     self.high[bucket] = value
+              self.latest = (bucket, value)
+
+       def restart(self):
+              """
+              function:     starts the series afresh from its latest value
+              input:        None
+              output:       None. Updates the series
+              """
+              if self.latest is None:
+                     return
+              bucket, value = self.latest
+              self.count[:bucket + 1] = 0
+              self.total[:bucket + 1] = 0
+              self.low[:bucket + 1] = np.iinfo(np.int32).max
+              self.high[:bucket + 1] = np.iinfo(np.int32).min
+              self.start = bucket
+              self.append(value, self.first + bucket*self.width)
+
+       def window(self):
+              """
+              function:     the buckets since the series was last restarted
+              input:        None
+              output:       slice of the bucket arrays
+              """
+              return slice(self.start, self.start + len(self))
+
+       def stats(self):
+              """
+              function:     the statistics of each bucket since the series was last restarted. empty buckets are NaN
+              input:        None
+              output:       dictionary of 'timing' (start of the bucket, minutes since the epoch), 'count', 'min', 'mean' and 'max'
+              """
+              window = self.window()
+              count = self.count[window]
+              empty = count == 0
+              with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                     mean = self.total[window] / count
+              return {'timing': self.first + np.arange(window.start, window.stop)*self.width,
+                      'count': count,
+                      'min': np.where(empty, np.nan, self.low[window]),
+                      'mean': mean,
+                      'max': np.where(empty, np.nan, self.high[window])}
+
+       def view(self):
+              """
+              function:     the mean of each bucket since the series was last restarted. empty buckets are NaN
+              input:        None
+              output:       float array
+              """
+              return self.stats()['mean']
+
+       def mean(self):
+              """
+              function:     average of the values since the series was last restarted (over the iterations, not the buckets)
+              input:        None
+              output:       float
+              """
+              window = self.window()
+              return self.total[window].sum() / self.count[window].sum()
+
+       def max(self):
+              """
+              function:     largest of the values since the series was last restarted
+              input:        None
+              output:       int
+              """
+              window = self.window()
+              return self.high[window][self.count[window] > 0].max()
+
+# Demand Window Class
+class DemandWindow():
+       """
+       This is the look ahead at the demand; how many of the containers among the next observation, and any 
+       others after it within `forward_dd` hours (never the last observation), are going to city and to tuas.
+       The window only ever moves forward. The latest count is kept, so the simulations of a Sweep with the 
+       same forward_dd work it out once per observation between them.
+       
+       input:        DISC_DT of the observations (minutes since the epoch), running count of the containers going to
+                     city, number of observations, how many hours to look ahead and the observation to start from
+       """
+       def __init__(self, disc_min, city_count, n, forward_dd, start):
+              self.disc_min = disc_min
+              self.city_count = city_count
+              self.n = n
+              self.forward_dd = forward_dd
+              self.window_end = start # the last observation within the window
+              self.latest = (None, 0, 0) # (observation, demand to city, demand to tuas) of the latest count
+
+       def at(self, i):
+              """
+              function:     the demand coming up after an observation
+              input:        index of the observation
+              output:       the number of containers going to city and to tuas
+              """
+              if self.latest[0] == i:
+                     return self.latest[1:]
+              n, disc_min, city_count = self.n, self.disc_min, self.city_count
+              window_end = max(self.window_end, i)
+              while window_end + 1 < n - 1 and round((disc_min[window_end + 1] - disc_min[i]) / 60, 2) <= self.forward_dd:
+                     window_end += 1
+              self.window_end = window_end
+              dd_last = min(max(window_end, i + 1), n - 2)
+              if dd_last > i:
+                     dd_to_city = city_count[dd_last + 1] - city_count[i + 1]
+                     dd_to_tuas = (dd_last - i) - dd_to_city
+              else:
+                     dd_to_tuas, dd_to_city = 0, 0
+              self.latest = (i, dd_to_city, dd_to_tuas)
+              return dd_to_city, dd_to_tuas
+
+# Run Summary Class
+class RunSummary():
+       """
+       This is the compact result of a simulation run without diagnostics; the status of each container
+       and how many were sent off as full, half and empty loads.
+       
+       input:        status codes of the containers (Simulation.PENDING, MOVED, ...) and the full, half and empty load counts
+       """
+       # what each status code is counted as, in the order of the codes (the same labels as plot())
+       status_labels = ['untouched', 'moved', 'missed', 'init', 'hs']
+
+       def __init__(self, status, full_load, half_load, empty_load):
+              self.status = status
+              self.counts = {label: int(count) for label, count in zip(self.status_labels, np.bincount(status, minlength = len(self.status_labels)))}
+              self.loads = {'full': full_load, 'half': half_load, 'empty': empty_load}
+
+       def __repr__(self):
+              return 'RunSummary(counts = ' + str(self.counts) + ', loads = ' + str(self.loads) + ')'
+
+       def load_mix(self):
+              """
+              function:     the share of each type of load out of all the loads sent off
+              input:        None
+              output:       dictionary of load type to proportion
+              """
+              total = sum(self.loads.values())
+              return {load: (count / total if total else 0) for load, count in self.loads.items()}
+
 # Simulation Class
 class Simulation():
        """
@@ -332,8 +967,15 @@ class Simulation():
        threshold_empty_movement = what's the the amount of PM at a location that would trigger a movement for an empty PM given high demand and backlog\n
        forward_dd = how many hours to look ahead to check demand\n
        threshold_vehicle_half = at how many hours is it considered urgent to send half a load by itself\n
-       move_over = how many empty PMs to moveover at a time
+       move_over = how many empty PMs to moveover at a time\n
+       travel_table = how many hours a trip takes (with mounting and offload) for each hour of the day, and full, half or empty load; a 24 x 3 table. by default, the peak hour and off peak times
        """
+       # status codes of the containers, and what each of them is shown as in the results
+       PENDING, MOVED, LATE, INIT, HEADSPACE = 0, 1, 2, 3, 4
+       status_names = [0, 1, 'Late', 'init', 'hs']
+       # the depart/arrive timing of a container that hasn't departed/arrived yet
+       NO_TIME = -1
+
        def __init__(self, tuas_vehicles = 150, 
                     city_vehicles = 150, 
                     threshold_connectingtime = 12, 
@@ -343,7 +985,8 @@ class Simulation():
                     threshold_empty_movement = 2, 
                     forward_dd = 2, 
                     threshold_vehicle_half = 25,
-                    move_over = 1):
+                    move_over = 1,
+                    travel_table = None):
               # how many vehicles at each location at the start
               self.tuas_vehicles = tuas_vehicles
               self.city_vehicles = city_vehicles
@@ -364,61 +1007,83 @@ class Simulation():
               # how many PMs to move over, when either side is low in PMs
               self.move_over = move_over
 
+              # how long a trip takes, by the hour of the day and the load
+              self.set_travel_table(travel_table)
+
               # tracking of Prime Movers as a whole
               self.PMs_track = {'tuas': tuas_vehicles,         # stands for Prime Movers
                                 'city': city_vehicles,
-                                'transit': {'dest': [], 'time' : [], 'index': [], 'size': []}
+                                'transit': [], # PMs on the road, as a heap of (arrival, order, depart, dest, index, size)
+                                'transit_dest': {'city': 0, 'tuas': 0} # how many PMs on the road are heading to each location
                                 }
+              self.transit_order = 0 # to keep the PMs that arrive at the same time in the order they departed
+              self.transit_pm = {} # which PM is on which trip, by the order of the trip
+              self.events = None # the queue of the event engine, while it's running
+              self.arrival_events = False
               
               # tracking containers
-              self.container = {'moved_index': [],
-                                'time': {'depart': [], 'arrive': []},
-                                'excess': []
-                                }
+              self.container = self.container_store(0, 0)
+
+              # live count of containers in the back log (passed over without being dispatched), per direction
+              self.back_log_count = {'EB_City': 0, 'WB_Tuas': 0}
+              # the back log itself, per direction and size, ordered by connection time remaining
+              self.back_log_queue = {}
+              self.deadline = None
+              self.column_lists = None # the scenario data as lists, during a run
+              self.demand = None # the look ahead at the demand, during a run
+              # the half length containers in the back log, per direction, in the order they came in
+              self.half_pending = {}
+              # how many containers are still waiting to be moved, and the earliest of them
+              self.pending_count = 0
+              self.oldest_pending = 0
+              # when deferred, the excess and Late status of the containers are settled in one go after the run
+              self.deferred = False
+              self.late_checks = [] # (index, observation its connection time is taken from, size code, timing)
+              self.slack = None # connection time left (hours) when the checked containers were sent off
+              # without diagnostics, only the container statuses and load counts are kept (no trip log, tracking or excess)
+              self.diagnostics = True
 
               # to track the progression of the amount of PMs at each location
-              self.transit_track = []
-              self.tuas_track = []
-              self.city_track = []
-              self.back_log_track_city = []
-              self.back_log_track_tuas = []
-              self.dd_track_city = []
-              self.dd_track_tuas = []
+              self.reset_tracks(0)
 
               # track how many full, half or empty vehicles that have been pushed off
               self.full_load = 0
               self.half_load = 0
               self.empty_load = 0
 
-              # Initialize PMs
+              # Initialize PMs, as views over the state of the fleet
+              self.fleet = FleetState(300)
               self.PMs = {}
               for i in range(1, 301):
                      if i <= 150:
                             if i <= 25:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [0]*7 + [1]*12 + [0]*5, '7m')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [0]*7 + [1]*12 + [0]*5, '7m', self.fleet, i - 1)
                             elif i <= 50:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [1]*7 + [0]*12 + [1]*5, '7n')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [1]*7 + [0]*12 + [1]*5, '7n', self.fleet, i - 1)
                             elif i <= 75:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [0]*8 + [1]*12 + [0]*4, '8m')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [0]*8 + [1]*12 + [0]*4, '8m', self.fleet, i - 1)
                             elif i <= 100:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [1]*8 + [0]*12 + [1]*4, '8n')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [1]*8 + [0]*12 + [1]*4, '8n', self.fleet, i - 1)
                             elif i <= 125:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [0]*9 + [1]*12 + [0]*3, '9m')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [0]*9 + [1]*12 + [0]*3, '9m', self.fleet, i - 1)
                             else:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [1]*9 + [0]*12 + [1]*3, '9n')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'city', [1]*9 + [0]*12 + [1]*3, '9n', self.fleet, i - 1)
                      else:
                             if i <= 175:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [0]*7 + [1]*12 + [0]*5, '7m')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [0]*7 + [1]*12 + [0]*5, '7m', self.fleet, i - 1)
                             elif i <= 200:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [1]*7 + [0]*12 + [1]*5, '7n')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [1]*7 + [0]*12 + [1]*5, '7n', self.fleet, i - 1)
                             elif i <= 225:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [0]*8 + [1]*12 + [0]*4, '8m') 
+                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [0]*8 + [1]*12 + [0]*4, '8m', self.fleet, i - 1) 
                             elif i <= 250:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [1]*8 + [0]*12 + [1]*4, '8n')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [1]*8 + [0]*12 + [1]*4, '8n', self.fleet, i - 1)
                             elif i <= 275:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [0]*9 + [1]*12 + [0]*3, '9m')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [0]*9 + [1]*12 + [0]*3, '9m', self.fleet, i - 1)
                             else:
-                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [1]*9 + [0]*12 + [1]*3, '9n')
+                                   self.PMs['PM_' + str(i)] = PM(i, 'tuas', [1]*9 + [0]*12 + [1]*3, '9n', self.fleet, i - 1)
+
+              # index of the PMs at each location, for picking a PM to send
+              self.build_pm_avail()
        
        ############## HELPER FUNCTIONS FOR THE SIMULATION ################
        def PM_locations(self):
@@ -427,7 +1092,7 @@ class Simulation():
               input:        None
               returns:      a string that states the location of all the PMs
               """
-              n_transit = len(self.PMs_track['transit']['time'])
+              n_transit = len(self.PMs_track['transit'])
               n_city = self.PMs_track['city']
               n_tuas = self.PMs_track['tuas']
               print('Transit:', n_transit, 'City:', n_city, 'Tuas:', n_tuas)
@@ -435,13 +1100,163 @@ class Simulation():
        def get_transit_dest_count(self): 
               """
               function:     counts the number of PMs that are currently on their way to a particular location
-              input:        dictionary of PMs
+              input:        None
               output:       the count of PMs that are on their way over to Tuas or City
               """
-              list_of_PMs = [pm for pm in self.PMs.values() if pm.location == 'transit']
-              city = list(map(lambda x: x.current_dest, list_of_PMs)).count('city')
-              tuas = list(map(lambda x: x.current_dest, list_of_PMs)).count('tuas')
-              return {'city': city, 'tuas': tuas}
+              transit_dest = self.PMs_track['transit_dest']
+              return {'city': transit_dest['city'], 'tuas': transit_dest['tuas']}
+
+       def reset_tracks(self, size, bucket = None, first = 0, last = 0):
+              """
+              function:     sets up the tracking of the PMs at each location, and of the demand and back log
+              input:        the most number of iterations that will be tracked. and if the series are to be
+                            bucketed, the length of a bucket (minutes) and the timings of the first and last iteration
+              output:       None. Replaces the tracking series with empty ones
+              """
+              self.track_bucket = bucket
+              new_track = (lambda: TrackBuffer(size)) if bucket is None else (lambda: BucketTrack(first, last, bucket))
+              self.transit_track = new_track()
+              self.tuas_track = new_track()
+              self.city_track = new_track()
+              self.back_log_track_city = new_track()
+              self.back_log_track_tuas = new_track()
+              self.dd_track_city = new_track()
+              self.dd_track_tuas = new_track()
+
+       def container_store(self, n, headspace):
+              """
+              function:     creates the record of the containers; one row per observation with its status code,
+                            depart and arrive timings (minutes since the epoch) and excess connection time (hours)
+              input:        number of observations and the amount of headspace
+              output:       structured array of the containers
+              """
+              container = np.zeros(n + headspace, dtype = [('status', np.uint8), 
+                                                           ('depart', np.int64), 
+                                                           ('arrive', np.int64), 
+                                                           ('excess', np.float32)])
+              container['status'][n:] = self.HEADSPACE
+              container['depart'] = self.NO_TIME
+              container['arrive'] = self.NO_TIME
+              container['excess'] = np.nan
+              return container
+
+       def container_record(self):
+              """
+              function:     the record of the containers in the form it's reported in; statuses as 0, 1, 'Late',
+                            'init' or 'hs', timings as datetimes (0 if there isn't one yet) and excess as floats ('0' 
+                            if there isn't one yet)
+              input:        None
+              output:       dictionary with 'moved_index', 'time' ('depart' and 'arrive') and 'excess' lists
+              """
+              record = {'moved_index': [], 'time': {'depart': [], 'arrive': []}, 'excess': []}
+              for status, depart, arrive, excess in self.container.tolist():
+                     if status == self.INIT or status == self.HEADSPACE:
+                            code = self.status_names[status]
+                            depart, arrive, excess = code, code, code
+                     else:
+                            depart = 0 if depart == self.NO_TIME else self.to_datetime(depart)
+                            arrive = 0 if arrive == self.NO_TIME else self.to_datetime(arrive)
+                            excess = '0' if excess != excess else excess # NaN when it hasn't arrived
+                     record['moved_index'].append(self.status_names[status])
+                     record['time']['depart'].append(depart)
+                     record['time']['arrive'].append(arrive)
+                     record['excess'].append(excess)
+              return record
+
+       def set_container_status(self, index, status):
+              """
+              function:     updates the moved status of a container, while keeping count of the
+                            containers that are still waiting to be moved
+              input:        index of the container and its new status (self.MOVED or self.LATE)
+              output:       None. Updates the container record
+              """
+              container_status = self.container['status']
+              if container_status[index] == self.PENDING:
+                     self.pending_count -= 1
+              container_status[index] = status
+              # move the pointer along to the next container that's still waiting
+              while self.oldest_pending < len(container_status) and container_status[self.oldest_pending] != self.PENDING:
+                     self.oldest_pending += 1
+
+       def back_log_size(self, container_size):
+              """
+              function:     the size class a container is queued under in the back log. 'half' holds the
+                            containers that can be paired up and sent as a full load
+              input:        LEN_Q of the container
+              output:       'half' or 'full'
+              """
+              return 'half' if container_size == 20 else 'full'
+
+       def enter_back_log(self, index, going_to, container_size):
+              """
+              function:     adds a container that was passed over without a PM to the back log
+              input:        index of the container, its direction and its LEN_Q
+              output:       None. Updates the back log counter and queue
+              """
+              self.back_log_count[going_to] = self.back_log_count.get(going_to, 0) + 1
+              key = (going_to, self.back_log_size(container_size))
+              if key not in self.back_log_queue:
+                     self.back_log_queue[key] = BackLogQueue()
+              self.back_log_queue[key].push(self.deadline[index], index)
+              if container_size <= 22:
+                     self.half_pending.setdefault(going_to, OrderedDict())[index] = container_size
+
+       def leave_back_log(self, index, going_to, container_size):
+              """
+              function:     removes a container from the back log once it's dispatched, marked Late or
+                            reclassified as 'init'
+              input:        index of the container, its direction and its LEN_Q
+              output:       None. Updates the back log counter and queue
+              """
+              self.back_log_count[going_to] = self.back_log_count.get(going_to, 0) - 1
+              self.back_log_queue[(going_to, self.back_log_size(container_size))].remove(self.deadline[index], index)
+              if container_size <= 22:
+                     del self.half_pending[going_to][index]
+
+       def back_log_order(self):
+              """
+              function:     merges the back log queues into one
+              input:        None
+              output:       list of the indexes of the back log from the shortest to the longest connection time remaining
+              """
+              return [index for _, index in heapq.merge(*[q.entries() for q in self.back_log_queue.values()])]
+
+       def extract_columns(self, df):
+              """
+              function:     to pull the scenario data out of the dataframe into typed arrays, once, so that 
+                            the simulation doesn't have to read the dataframe cell by cell
+              input:        scenario data in the form of a dataframe
+              output:       dictionary of arrays; 'direction' (int8 codes of self.direction_names), 'size' (LEN_Q as int16),
+                            'disc_dt' (DISC_DT as int64 minutes since self.epoch) and 'connect_time' (Connect_SceneC as float64)
+              """
+              direction_names, direction = np.unique(df['DIRECTION_shift'].values.astype(str), return_inverse = True)
+              self.direction_names = direction_names.tolist()
+              # the simulation's clock counts minutes from the midnight before the first discharge
+              disc_dt = df['DISC_DT'].values.astype('datetime64[ns]')
+              self.epoch = pd.Timestamp(disc_dt.min()).normalize()
+              disc_dt = (disc_dt - np.datetime64(self.epoch, 'ns')) // np.timedelta64(1, 'm')
+              return {'direction': direction.astype(np.int8),
+                      'size': df['LEN_Q'].values.astype(np.int16),
+                      'disc_dt': disc_dt.astype(np.int64),
+                      'connect_time': df['Connect_SceneC'].values.astype(np.float64)}
+
+       def add_headspace(self, columns, n, headspace):
+              """
+              function:     adds the headspace to the end of the scenario data; observations 5 minutes apart after the 
+                            last one (the n-th), going 'Neither' way with no container (LEN_Q 0, Connect_SceneC -1), so 
+                            that the PMs still on the road get to arrive. the dataframe itself is left as it is
+              input:        dictionary of arrays from extract_columns, number of observations and the amount of headspace
+              output:       dictionary of arrays with the headspace at the end
+              """
+              if headspace == 0:
+                     return columns
+              if 'Neither' not in self.direction_names:
+                     self.direction_names.append('Neither')
+              tail = {'direction': np.full(headspace, self.direction_names.index('Neither'), dtype = np.int8),
+                      'size': np.zeros(headspace, dtype = np.int16),
+                      'disc_dt': columns['disc_dt'][n - 1] + 5*np.arange(1, headspace + 1, dtype = np.int64),
+                      'connect_time': np.full(headspace, -1, dtype = np.float64)}
+              return {name: np.concatenate([values, tail[name]]) for name, values in columns.items()}
 
        def container_info(self, data, container_id, info):
               """
@@ -470,29 +1285,187 @@ class Simulation():
               result = (result / 60) / 60
               result = round(result, 2)
               return result
+
+       def minutes_to_hours(self, minutes):
+              """
+              function:     to convert a duration in minutes into hours, the same way as get_hours
+              input:        duration in minutes
+              returns:      time in terms of hours
+              """
+              # as a python float; rounding a numpy scalar is many times slower
+              result = float(minutes) / 60
+              result = round(result, 2)
+              return result
+
+       def get_hour(self, timing):
+              """
+              function:     to get the hour of the day of a timing on the simulation's clock
+              input:        minutes since the epoch
+              returns:      hour of the day (0 - 23)
+              """
+              return (timing // 60) % 24
+
+       def to_datetime(self, timing):
+              """
+              function:     to convert a timing on the simulation's clock back into a datetime
+              input:        minutes since the epoch
+              returns:      datetime value
+              """
+              return self.epoch + datetime.timedelta(minutes = int(timing))
        
+       def build_pm_avail(self):
+              """
+              function:     indexes the PMs that are at tuas or city by location and by work profile (work shift,
+                            working hours and meal hour, which decide when they're able to work). each bucket is a 
+                            heap on the PMs' trip count, so the least used PM is always on top
+              input:        None
+              output:       None. Rebuilds the availability index from the PMs
+              """
+              self.pm_avail = {'city': {}, 'tuas': {}}
+              # the work calendar of every PM, one row per PM (in the order of self.PMs)
+              self.pm_calendar = np.array([pm.work_calendar for pm in self.PMs.values()])
+              for pm in self.PMs.values():
+                     if pm.location in self.pm_avail:
+                            self.enter_pm_avail(pm)
+
+       def get_slot(self, time):
+              """
+              function:     to get the half hour slot of the day that a timing falls in
+              input:        a timing; minutes since the epoch
+              output:       slot number, from 0 (00:00 - 00:29) to 47 (23:30 - 23:59)
+              """
+              return (time // 30) % 48
+
+       def enter_pm_avail(self, pm):
+              """
+              function:     adds a PM that's arrived at a location to the availability index
+              input:        the PM
+              output:       None. Updates the availability index
+              """
+              bucket = self.pm_avail[pm.location].setdefault(pm.work_profile, [])
+              heapq.heappush(bucket, (int(self.fleet.departs[pm.slot]), pm.index, pm))
+
        def check_pm_avail(self, time, dest, trip_type):
               """
               function:     checks for the availability of a pm based on the location and timing
-              input:        timing, destination, type of trip (full, half, empty)
-              output:       either False or an available PM
+              input:        timing (minutes since the epoch), destination, type of trip (full, half, empty)
+              output:       either False or an available PM. the PM with the least trips, and the first
+                            of them (by index) when there's a tie
               """
               ds = {'city': 'tuas', 'tuas': 'city'}
-              list_of_PMs = [x for x in self.PMs.values() if (x.able_to_work(time) and x.location == ds[dest])]
-       
-              if list_of_PMs:
-                     least = -1
-                     p = False
-                     for pm in list_of_PMs:
-                            l = len(pm.work_log['depart'])
-                            if l == 0:
-                                   return pm
-                            elif l < least or least == -1:
-                                   least = l
-                                   p = pm
-                     return p
-              return False
-       
+              location = ds[dest]
+              code = FleetState.location_codes[location]
+              fleet_location, departs = self.fleet.location, self.fleet.departs
+              slot = self.get_slot(time)
+              p = False
+              for profile, bucket in self.pm_avail[location].items():
+                     # PMs that have departed since they were added are dropped off the top
+                     while bucket and (fleet_location[bucket[0][2].slot] != code or departs[bucket[0][2].slot] != bucket[0][0]):
+                            heapq.heappop(bucket)
+                     if bucket and PM.work_calendars[profile][slot]:
+                            if not p or bucket[0][:2] < (departs[p.slot], p.index):
+                                   p = bucket[0][2]
+              return p
+       
+       def allocate_pms(self, time, dest, trip_type, loads):
+              """
+              function:     sends off as many PMs as there are loads (or as many as are available), picking them the
+                            same way check_pm_avail does one at a time; the least trips first, then the first by index.
+                            they're taken off the availability index and departed together
+              input:        timing (minutes since the epoch), destination, type of trip (full, half, empty) and the
+                            (container_1, container_2) of each load
+              output:       list of the PMs sent off, in the order of the loads they carry
+              """
+              ds = {'city': 'tuas', 'tuas': 'city'}
+              location = ds[dest]
+              code = FleetState.location_codes[location]
+              fleet_location, departs = self.fleet.location, self.fleet.departs
+              slot = self.get_slot(time)
+              buckets = [bucket for profile, bucket in self.pm_avail[location].items() if PM.work_calendars[profile][slot]]
+              pms = []
+              while len(pms) < len(loads):
+                     best = None
+                     for bucket in buckets:
+                            # PMs that have departed since they were added are dropped off the top
+                            while bucket and (fleet_location[bucket[0][2].slot] != code or departs[bucket[0][2].slot] != bucket[0][0]):
+                                   heapq.heappop(bucket)
+                            if bucket and (best is None or bucket[0][:2] < best[0][:2]):
+                                   best = bucket
+                     if best is None:
+                            break
+                     pms.append(heapq.heappop(best)[2])
+              if pms:
+                     self.fleet.depart_many([pm.slot for pm in pms], dest, trip_type, time, loads[:len(pms)])
+              return pms
+
+       def default_travel_table(self):
+              """
+              function:     the travel times used when no table is given; the road takes longer at the peak hours 
+                            (7 - 9am and 5 - 8pm) and with a heavier load, plus 0.25 hours each to mount and offload
+              input:        None
+              output:       array of the trip durations in hours, one row per hour of the day, with columns for
+                            full, half and empty trips
+              """
+              peak_hours = [7, 8, 9, 17, 18, 19, 20]
+              table = np.array([[2.5, 2.3, 2] if hour in peak_hours else [2, 1.8, 1.5] for hour in range(24)])
+              return table + 0.25 + 0.25
+
+       def set_travel_table(self, table = None):
+              """
+              function:     sets the travel times that decide how long the PMs take to make a trip
+              input:        array of trip durations in hours, including mounting and offload, one row per hour 
+                            of the day (24) with columns for full, half and empty trips. None for the default
+              output:       None. Updates the travel table
+              """
+              table = self.default_travel_table() if table is None else np.array(table, dtype = np.float64)
+              if table.shape != (24, len(FleetState.trip_types)):
+                     raise ValueError('travel table needs 24 rows (hours) and 3 columns (full, half, empty)')
+              if not (np.isfinite(table) & (table > 0)).all():
+                     raise ValueError('travel table needs every trip duration to be a number of hours above 0 (no NaN, infinite, zero or negative values)')
+              self.travel_table = table
+              self.travel_rows = table.tolist() # for looking up one trip at a time
+              # how many minutes after departing a PM is counted as arrived, by the hour and the load (see transit_due)
+              self.transit_minutes = [[self.minutes_out(duration) for duration in row] for row in self.travel_rows]
+
+       def minutes_out(self, duration):
+              """
+              function:     the first whole number of minutes out whose rounded duration (see minutes_to_hours) is past
+                            a trip duration
+              input:        trip duration in hours
+              output:       minutes
+              """
+              minutes = int(duration*60)
+              while self.minutes_to_hours(minutes) <= duration:
+                     minutes += 1
+              return minutes
+
+       def transit_duration(self, size, timing):
+              """
+              function:     how long a PM is out on a trip before it's counted as arrived. the twist being, 
+                            the duration of travel is based on the size of the container being moved, and 
+                            the hour it's moved in
+              input:        size of container and the time the PM departed (minutes since the epoch)
+              output:       duration in hours, including the mounting and offload time at PP/Tuas
+              """
+              return self.travel_rows[self.get_hour(timing)][FleetState.trip_types.get(size, 2)]
+
+       def transit_durations(self, sizes, timings):
+              """
+              function:     transit_duration of many trips at once
+              input:        arrays of the sizes (codes of FleetState.trip_types) and timings (minutes since the epoch)
+              output:       array of durations in hours
+              """
+              return self.travel_table[(np.asarray(timings) // 60) % 24, sizes]
+
+       def transit_due(self, size, timing):
+              """
+              function:     the first minute at which a PM that departs is counted as arrived, going by the same rule 
+                            as leave_transit; its rounded duration out has to be past the trip duration
+              input:        size of the load and the departure time (minutes since the epoch)
+              output:       arrival timing (minutes since the epoch)
+              """
+              return timing + self.transit_minutes[self.get_hour(timing)][FleetState.trip_types.get(size, 2)]
+
        def pm_arrival_updater(self, duration_out, size, timing): # changed
               """
               function:     updates whether the pm has arrived at the location
@@ -505,75 +1478,98 @@ class Simulation():
               output:       a boolean list representing those that have reached
                             vs. those that haven't
               """
-              def boolean_generator(index):
-                     t = timing[index].time().hour
-                     do = duration_out[index]
-                     s = size[index]
-                     if (t >= 7 and t <= 9) or (t >= 17 and t <= 20):
-                            if s == 'full':
-                                   # this timing would include the mounting time at PP/Tuas
-                                   # and the offload time at PP/Tuas
-                                   if do > (2.5 + 0.25 + 0.25):
-                                          return False
-                                   else:
-                                          return True
-                            elif s == 'half':
-                                   # this timing would include the mounting time at PP/Tuas
-                                   # and the offload time at PP/Tuas
-                                   if do > (2.3 + 0.25 + 0.25):
-                                          return False
-                                   else:
-                                          return True
-                            else:
-                                   # only the travel time
-                                   if do > (2 + 0.25 + 0.25):
-                                          return False
-                                   else:
-                                          return True
+              sizes = [FleetState.trip_types.get(x, 2) for x in size]
+              return np.asarray(duration_out) <= self.transit_durations(sizes, timing)
+
+       def enter_transit(self, pm, timing, dest, index, size, arrival = None):
+              """
+              function:     puts a PM that's just departed on the road, keyed by the time it arrives
+              input:        the PM (with its current_dest set), departure time, where it's headed, the container index(es) it carries,
+                            the size of the load, and when it arrives (worked out from the size and departure time if None)
+              output:       None. Updates the PMs in transit
+              """
+              if arrival is None:
+                     arrival = self.transit_due(size, timing)
+              if self.events is not None and self.arrival_events:
+                     self.events.push(arrival, EventQueue.ARRIVAL)
+              heapq.heappush(self.PMs_track['transit'], (arrival, self.transit_order, timing, dest, index, size))
+              self.transit_pm[self.transit_order] = pm
+              self.transit_order += 1
+              self.PMs_track['transit_dest'][pm.current_dest] += 1
+
+       def leave_transit(self, timing):
+              """
+              function:     takes the PMs that have reached the other location off the road. only the PMs
+                            due by now are looked at, and they're checked against the same rule as pm_arrival_updater
+              input:        the current timing
+              output:       list of (depart, dest, index, size, PM) of the PMs that arrived, in the order they departed
+              """
+              transit = self.PMs_track['transit']
+              arrived, not_yet = [], []
+              while transit and transit[0][0] <= timing:
+                     pm_trip = heapq.heappop(transit)
+                     # a PM is only counted as arrived once the rounded duration out is past its trip duration
+                     if self.minutes_to_hours(timing - pm_trip[2]) > self.transit_duration(pm_trip[5], pm_trip[2]):
+                            arrived.append(pm_trip)
                      else:
-                            if s == 'full':
-                                   if do > (2 + 0.25 + 0.25):
-                                          return False
-                                   else:
-                                          return True
-                            elif s == 'half':
-                                   if do > (1.8 + 0.25 + 0.25):
-                                          return False
-                                   else:
-                                          return True
-                            else:
-                                   # this is only travel time
-                                   if do > (1.5 + 0.25 + 0.25):
-                                          return False
-                                   else:
-                                          return True
-              result = [boolean_generator(i) for i in range(len(duration_out))]
-              result = np.array(result)
-              return result
+                            not_yet.append(pm_trip)
+              for pm_trip in not_yet:
+                     heapq.heappush(transit, pm_trip)
+              arrived.sort(key = lambda x: x[1])
+              arrived = [pm_trip[2:] + (self.transit_pm.pop(pm_trip[1]),) for pm_trip in arrived]
+              for pm_trip in arrived:
+                     self.PMs_track['transit_dest'][pm_trip[-1].current_dest] -= 1
+              return arrived
        
        def travel_duration(self, size, timing):
               """
               function:     to determine the travel duration of a particular PM based on the time of travel and the
                             size of container that's being transported
-              input:        size of container and discharge time
+              input:        size of container and discharge time (minutes since the epoch)
               output:       travel duration
        
               """
-              if (timing.time().hour >= 7 and timing.time().hour <= 9) or (timing.time().hour >= 17 and timing.time().hour <= 20):
-                     if size == 'full':
-                            return 3
-                     elif size == 'half':
-                            return 2.8
-                     else:
-                            return 2.5
+              return self.transit_duration(size, timing)
+
+       def check_late(self, index, ref, size, timing):
+              """
+              function:     marks a container that's been sent off as Late if the connection time remaining of
+                            observation `ref` is within the travel duration, and as Moved otherwise. when deferred,
+                            it's marked as Moved and checked in settle_containers
+              input:        index of the container, the observation its connection time is taken from, the size of
+                            the load (full, half) and the timing it's sent off
+              output:       None. Updates the container record
+              """
+              if self.deferred:
+                     self.late_checks.append((index, ref, FleetState.trip_types[size], timing))
+                     self.set_container_status(index, self.MOVED)
+              elif self.column_lists['connect_time'][ref] - self.minutes_to_hours(timing - self.column_lists['disc_dt'][ref]) <= self.travel_duration(size, timing):
+                     self.set_container_status(index, self.LATE)
               else:
-                     if size == 'full':
-                            return 2.5
-                     elif size == 'half':
-                            return 2.3
-                     else:
-                            return 2
-       
+                     self.set_container_status(index, self.MOVED)
+
+       def settle_containers(self):
+              """
+              function:     works out what was deferred during the run, all at once; the excess connection time of 
+                            the containers that have arrived, the connection time left when the checked containers 
+                            were sent off (self.slack) and which of them are Late
+              input:        None
+              output:       None. Updates the container record
+              """
+              container = self.container
+              connect, disc_min = self.columns['connect_time'], self.columns['disc_dt']
+              arrived = np.flatnonzero(container['arrive'] != self.NO_TIME)
+              duration_out = container['arrive'][arrived] - container['depart'][arrived] - 15
+              container['excess'][arrived] = connect[arrived] - np.round(duration_out / 60, 2)
+
+              index, ref, size, timing = np.array(self.late_checks, dtype = np.int64).reshape(-1, 4).T
+              slack = connect[ref] - np.round((timing - disc_min[ref]) / 60, 2)
+              self.slack = np.full(len(container), np.nan)
+              self.slack[index] = slack
+              # the containers that have since been taken as part of the initialisation stay that way
+              late = (slack <= self.transit_durations(size, timing)) & (container['status'][index] == self.MOVED)
+              container['status'][index[late]] = self.LATE
+
        ############## EVALUATION FUNCTIONS FOR THE SIMULATION ################
        def shift_change_analysis(self, shift):
               """
@@ -581,13 +1577,14 @@ class Simulation():
               input:        which shift to analyse
               output:       the analysis and breakdown of all the PMs during that particular shift change
               """
-              pms = [x for x in self.PMs.values() if x.work_shift == shift]
+              fleet = list(self.PMs.values())
+              pms = [fleet[slot] for slot in self.fleet.on_shift(shift)]
               end_shift_pm_locations = []
               for pm in pms:
                      end_shift_timing_index = []
                      a = pm.work_log['arrive']
                      for i in range(1, len(a)):
-                            if self.get_hours(a[i] - a[i-1]) >= 11:
+                            if self.minutes_to_hours(a[i] - a[i-1]) >= 11:
                                    end_shift_timing_index.append(i - 1) # index i - 1 should be the index of the end of shift
                      end_shift_pm_locations.extend([e for i, e in enumerate(pm.trips_count['dest']) if i in end_shift_timing_index])
               tuas = end_shift_pm_locations.count('tuas')
@@ -642,15 +1639,27 @@ class Simulation():
                             And Arrive: The timing of which the container has been offloaded at the destination
        
               """
-              c_t = self.container['time']
+              # the timings are converted from the simulation's clock back into datetimes
+              record = self.container_record()
+              c_t = record['time']
               arrive = c_t['arrive']
               depart = c_t['depart']
               exit_gate_to_offload_time = pd.DataFrame({'depart': depart, 'arrive': arrive})
-              exit_gate_to_offload_time['Moved Status'] = self.container['moved_index']
+              exit_gate_to_offload_time['Moved Status'] = record['moved_index']
               os.chdir(origin + '/Results')
               exit_gate_to_offload_time.to_csv('tss_results.csv')
               os.chdir(origin)
               
+       def export_trip_log(self):
+              """
+              function:     to export the log of every trip made by the PMs, in one write
+              input:        None
+              returns:      None. Saves Trip_Log.npy, with the timings in minutes since the epoch
+              """
+              os.chdir(origin + '/Results')
+              self.fleet.trip_log.save('Trip_Log.npy')
+              os.chdir(origin)
+
        ################# PLOT AND TEXT FUNCTIONS FOR THE SIMULATION ##################
        def plot_vehicle_pattern(self):
               """
@@ -662,23 +1671,25 @@ class Simulation():
               """
               os.chdir(origin + '/Results')
               
+              city_track, transit_track, tuas_track = self.city_track.view(), self.transit_track.view(), self.tuas_track.view()
+              
               # plotting the graph
-              plt.bar(range(len(self.city_track)),
-                      self.city_track,
+              plt.bar(range(len(city_track)),
+                      city_track,
                       label = 'city',
                       alpha = 0.9,
                       width = 0.7,
                       color = 'dodgerblue')
-              plt.bar(range(len(self.transit_track)),
-                      self.transit_track,
-                      bottom = self.city_track,
+              plt.bar(range(len(transit_track)),
+                      transit_track,
+                      bottom = city_track,
                       label = 'transit',
                       alpha = 0.9,
                       width = 0.7,
                       color = 'navajowhite')
-              plt.bar(range(len(self.tuas_track)),
-                      self.tuas_track,
-                      bottom = [i + j for i, j in zip(self.city_track, self.transit_track)],
+              plt.bar(range(len(tuas_track)),
+                      tuas_track,
+                      bottom = city_track + transit_track,
                       label = 'tuas',
                       alpha = 0.9,
                       width = 0.7,
@@ -688,7 +1699,7 @@ class Simulation():
               topbar = plt.Rectangle((0, 0), 0.2, 0.2, fc = 'indianred', edgecolor = 'none')
               middlebar = plt.Rectangle((0, 0), 0.2, 0.2, fc = 'navajowhite', edgecolor = 'none')
               bottombar = plt.Rectangle((0, 0), 0.2, 0.2, fc = 'dodgerblue', edgecolor = 'none')
-              plt.ylabel('Proportion'); plt.xlabel('Time')
+              plt.ylabel('Proportion'); plt.xlabel('Time' if self.track_bucket is None else 'Time (' + str(self.track_bucket) + ' min buckets)')
               l = plt.legend([topbar, middlebar, bottombar], 
                              ['Tuas', 'Transit', 'City'], 
                              loc = 0, 
@@ -761,57 +1772,60 @@ class Simulation():
               input:        None
               returns:      plots and a png file
               """
+              dd_track_city, dd_track_tuas = self.dd_track_city.view(), self.dd_track_tuas.view()
+              back_log_track_city, back_log_track_tuas = self.back_log_track_city.view(), self.back_log_track_tuas.view()
+              x_label = 'Iteration' if self.track_bucket is None else 'Bucket (' + str(self.track_bucket) + ' min)'
               os.chdir(origin + '/Results')
               plt.subplot(2, 2, 1)
-              plt.plot(range(1, len(self.dd_track_city) + 1), self.dd_track_city)
+              plt.plot(range(1, len(dd_track_city) + 1), dd_track_city)
               plt.title('Demand towards City')
-              plt.xlabel('Iteration'); plt.ylabel('Demand')
+              plt.xlabel(x_label); plt.ylabel('Demand')
               plt.subplot(2, 2, 2)
-              plt.plot(range(1, len(self.back_log_track_city) + 1), self.back_log_track_city)
+              plt.plot(range(1, len(back_log_track_city) + 1), back_log_track_city)
               plt.title('Back log towards City')
-              plt.xlabel('Iteration'); plt.ylabel('Back Log Count')
+              plt.xlabel(x_label); plt.ylabel('Back Log Count')
               plt.subplot(2, 2, 3)
-              plt.plot(range(1, len(self.dd_track_tuas) + 1), self.dd_track_tuas)
+              plt.plot(range(1, len(dd_track_tuas) + 1), dd_track_tuas)
               plt.title('Demand towards Tuas')
-              plt.xlabel('Iteration'); plt.ylabel('Demand')
+              plt.xlabel(x_label); plt.ylabel('Demand')
               plt.subplot(2, 2, 4)
-              plt.plot(range(1, len(self.back_log_track_tuas) + 1), self.back_log_track_tuas)
+              plt.plot(range(1, len(back_log_track_tuas) + 1), back_log_track_tuas)
               plt.title('Back log towards Tuas')
-              plt.xlabel('Iteration'); plt.ylabel('Back Log Count')
+              plt.xlabel(x_label); plt.ylabel('Back Log Count')
               plt.subplots_adjust(hspace = 0.8, wspace = 0.8)
               plt.savefig('Demand And Backlog.png')
               plt.show()
               
               print('\nDemand Stats:', 
                     '\n###TO CITY###', 
-                    '\nAvg:\t', int(np.mean(self.dd_track_city)*(10**2))/(10**2), 
-                    '\nMax:\t', max(self.dd_track_city), 
+                    '\nAvg:\t', int(self.dd_track_city.mean()*(10**2))/(10**2), 
+                    '\nMax:\t', self.dd_track_city.max(), 
                     '\n###TO TUAS###', 
-                    '\nAvg:\t', int(np.mean(self.dd_track_tuas)*(10**2))/(10**2), 
-                    '\nMax:\t', max(self.dd_track_tuas))
+                    '\nAvg:\t', int(self.dd_track_tuas.mean()*(10**2))/(10**2), 
+                    '\nMax:\t', self.dd_track_tuas.max())
               print('\nBack Log Stats:', 
                     '\n###TO CITY###', 
-                    '\nAvg:\t', int(np.mean(self.back_log_track_city)*(10**2))/(10**2),
-                    '\nMax:\t', max(self.back_log_track_city), 
+                    '\nAvg:\t', int(self.back_log_track_city.mean()*(10**2))/(10**2),
+                    '\nMax:\t', self.back_log_track_city.max(), 
                     '\n###TO TUAS###', 
-                    '\nAvg:\t', int(np.mean(self.back_log_track_tuas)*(10**2))/(10**2), 
-                    '\nMax:\t', max(self.back_log_track_tuas))
+                    '\nAvg:\t', int(self.back_log_track_tuas.mean()*(10**2))/(10**2), 
+                    '\nMax:\t', self.back_log_track_tuas.max())
               
               text_file = open('Demand And Backlog.txt', 'w')
               text_file.writelines(['Demand Stats:', 
                                     '\n###TO CITY###', 
-                                    '\nAvg:\t' + str(int(np.mean(self.dd_track_city)*(10**2))/(10**2)), 
-                                    '\nMax:\t' + str(max(self.dd_track_city)), 
+                                    '\nAvg:\t' + str(int(self.dd_track_city.mean()*(10**2))/(10**2)), 
+                                    '\nMax:\t' + str(self.dd_track_city.max()), 
                                     '\n###TO TUAS###', 
-                                    '\nAvg:\t' + str(int(np.mean(self.dd_track_tuas)*(10**2))/(10**2)),
-                                    '\nMax:\t' + str(max(self.dd_track_tuas)),
+                                    '\nAvg:\t' + str(int(self.dd_track_tuas.mean()*(10**2))/(10**2)),
+                                    '\nMax:\t' + str(self.dd_track_tuas.max()),
                                     '\n\nBack Log Stats:', 
                                     '\n###TO CITY###', 
-                                    '\nAvg:\t' + str(int(np.mean(self.back_log_track_city)*(10**2))/(10**2)),
-                                    '\nMax:\t' + str(max(self.back_log_track_city)),
+                                    '\nAvg:\t' + str(int(self.back_log_track_city.mean()*(10**2))/(10**2)),
+                                    '\nMax:\t' + str(self.back_log_track_city.max()),
                                     '\n###TO TUAS###',
-                                    '\nAvg:\t' + str(int(np.mean(self.back_log_track_tuas)*(10**2))/(10**2)),
-                                    '\nMax:\t' + str(max(self.back_log_track_tuas))])
+                                    '\nAvg:\t' + str(int(self.back_log_track_tuas.mean()*(10**2))/(10**2)),
+                                    '\nMax:\t' + str(self.back_log_track_tuas.max())])
               text_file.close()
               os.chdir(origin)
                
@@ -834,10 +1848,11 @@ class Simulation():
               self.plot_dd_back_log()
               
               # how many containers have been moved
-              total_containers = len(self.container['moved_index']) - self.container['moved_index'].count('init') - self.container['moved_index'].count('hs')
-              moved_1s = self.container['moved_index'].count(1)
-              not_moved_0s = self.container['moved_index'].count(0)
-              couldnt_move_n2 = self.container['moved_index'].count('Late')
+              status_count = np.bincount(self.container['status'], minlength = len(self.status_names)).tolist()
+              total_containers = len(self.container) - status_count[self.INIT] - status_count[self.HEADSPACE]
+              moved_1s = status_count[self.MOVED]
+              not_moved_0s = status_count[self.PENDING]
+              couldnt_move_n2 = status_count[self.LATE]
               print('\nStatus of Containers (Count):')
               print('Moved:    ', moved_1s, '   \t(' + str(round((moved_1s / total_containers)*100, 2)) + '%)')
               print('Untouched:', not_moved_0s, '   \t(' + str(round((not_moved_0s / total_containers)*100, 2)) + '%)')
@@ -852,553 +1867,670 @@ class Simulation():
               text_file.close()
               os.chdir(origin)
               
-       ##################### ACTUAL SIMULATION #########################
-       def simulate_shifting(self, df, n = 1000, headspace = 50, bl = 100, init = 50):
+       ##################### STEPS OF THE SIMULATION #########################
+       def observe(self, i, last = None):
               """
-              function:     simulates the shifting of containers between tuas and city
-              input:        scenario data in the form of a dataframe with only the number of containers that it wants to simulate,
-                            the number of scenario it wants to simulate,
-                            the amount of headspace given to run,
-                            the amount of backlog,
-                            the amount to use for initialisation (something like a seed)
-              returns:      DataFrame [Refer to export_result() function to find out what's being exported] and Plots
+              function:     one step of the simulation; the discharge of observation i (or of the observations i to
+                            last - 1, which share the same DISC_DT). the PMs that have arrived are updated, the back log
+                            is settled, the containers are sent off if they can be and empty PMs are moved over
+              input:        index of the (first) observation, and the index after the last one discharged together
+              output:       None. Updates the state of the simulation
+              """
+              last = i + 1 if last is None else last
+              bl, init = self.bl, self.init
+              status, arrive_time = self.container['status'], self.container['arrive']
+              columns, direction_names = self.column_lists, self.direction_names
+              direction, size, disc_min = columns['direction'], columns['size'], columns['disc_dt']
+
+              # this is to 'naturally' initialize the variables
+              if i == init + bl:
+                     # reset tracking after the initialisation iterations
+                     container_bool = (arrive_time[:init + bl + 1] != self.NO_TIME) | (status[:init + bl + 1] == self.HEADSPACE)
+                     # (only containers that have arrived, or headspace, are taken; none of them are in the back log)
+                     for i, b in enumerate(container_bool):
+                            if b:
+                                   status[i] = self.INIT
+       
+                     # restarting the tracking of PMs at Tuas, City and Transit
+                     self.transit_track.restart()
+                     self.tuas_track.restart()
+                     self.city_track.restart()
+       
+                     self.full_load = 0
+                     self.half_load = 0
+                     self.empty_load = 0
+
+              # tracking the counts at each location
+              if self.diagnostics:
+                     self.tuas_track.append(self.PMs_track['tuas'], disc_min[i])
+                     self.city_track.append(self.PMs_track['city'], disc_min[i])
+                     self.transit_track.append(len(self.PMs_track['transit']), disc_min[i])
+       
+              # structure the observation data
+              disc_dt = disc_min[i]
+
+              # update the PMs that are on transit, to check if they've reached the other location
+              self.arrive_pms(disc_dt)
+
+              # checking of demand and backlog
+              # look before
+              back_log_to_city = self.back_log_count['EB_City']
+              back_log_to_tuas = self.back_log_count['WB_Tuas']
+              # look after
+              # the containers counted are the next one, and any others after it within `forward_dd` hours
+              # (never the last observation). when several are discharged together, it's what comes after the last of them
+              k = last - 1
+              dd_to_city, dd_to_tuas = self.demand.at(k)
+              if self.diagnostics:
+                     self.back_log_track_city.append(back_log_to_city, disc_dt)
+                     self.back_log_track_tuas.append(back_log_to_tuas, disc_dt)
+                     self.dd_track_city.append(dd_to_city, disc_dt)
+                     self.dd_track_tuas.append(dd_to_tuas, disc_dt)
+       
+              # checking on the number of PMs otw to each location
+              transit_to_dest = self.get_transit_dest_count()
+              transit_to_city, transit_to_tuas = transit_to_dest['city'], transit_to_dest['tuas']
+
+              # updating of unmoved containers
+              if self.oldest_pending < i:
+                     self.settle_back_log(disc_dt)
+
+              # sending off the containers, in order. a container is part of the back log if it couldn't be sent off,
+              # so a half length one can still be paired up with the next one going the same way
+              for j in range(i, last):
+                     self.dispatch_container(j, dd_to_city, dd_to_tuas)
+                     if status[j] == self.PENDING:
+                            self.enter_back_log(j, direction_names[direction[j]], size[j])
+
+              # moving empty PMs over to where they're needed
+              self.move_empty_pms(k, dd_to_city, dd_to_tuas, back_log_to_city, back_log_to_tuas, transit_to_city, transit_to_tuas)
+
+       def arrive_pms(self, disc_dt):
+              """
+              function:     takes the PMs that have reached the other location off the road, and records the arrival
+                            of the containers they carried
+              input:        the current timing (minutes since the epoch)
+              output:       the number of PMs that arrived
+              """
+              arrive_time, excess, depart_time = self.container['arrive'], self.container['excess'], self.container['depart']
+              connect, settle_excess = self.column_lists['connect_time'], self.diagnostics and not self.deferred
+              arrived = self.leave_transit(disc_dt)
+              for transit_time, transit_dest, transit_index, transit_size, arrived_pm in arrived:
+                     # update location count
+                     self.PMs_track[transit_dest] += 1
+       
+                     # update PMs
+                     self.fleet.arrive(arrived_pm.slot, disc_dt)
+                     self.enter_pm_avail(arrived_pm)
+       
+                     # update containers
+                     if type(transit_index) != str:
+                            for arrival_index in (transit_index if type(transit_index) == list else [transit_index]):
+                                   arrive_time[arrival_index] = disc_dt
+                                   if settle_excess:
+                                          excess[arrival_index] = connect[arrival_index] - self.minutes_to_hours(disc_dt - depart_time[arrival_index] - 15)
+              return len(arrived)
+
+       def settle_back_log(self, disc_dt):
+              """
+              function:     sends off what it can of the back log; the half length containers paired up as full loads
+                            first, then the rest by connection time remaining (shortest to longest)
+              input:        the current timing (minutes since the epoch)
+              output:       None. Updates the state of the simulation
+              """
+              depart_time, direction_names = self.container['depart'], self.direction_names
+              columns = self.column_lists
+              direction, size, disc_min, connect = columns['direction'], columns['size'], columns['disc_dt'], columns['connect_time']
+              # send the half loads as full loads
+              if self.PMs_track['city'] + self.PMs_track['tuas'] != 0:
+                     # only handling half containers, already sorted by connection time remaining (shortest to longest)
+                     index_zero_to_tuas = self.back_log_queue[('WB_Tuas', 'half')].indexes() if ('WB_Tuas', 'half') in self.back_log_queue else []
+                     index_zero_to_city = self.back_log_queue[('EB_City', 'half')].indexes() if ('EB_City', 'half') in self.back_log_queue else []
+       
+                     if index_zero_to_tuas:
+                            # a PM for each pair, for as long as there are PMs at city
+                            pairs = [(index_zero_to_tuas[j], index_zero_to_tuas[j - 1]) for j in range(1, len(index_zero_to_tuas), 2)]
+                            duty_pms = self.allocate_pms(disc_dt, 'tuas', 'full', pairs[:max(self.PMs_track['city'], 0)])
+                            # the PMs of a batch leave together with the same load size, so they're due at the same time
+                            arrival = self.transit_due('full', disc_dt)
+                            for j, duty_pm in zip(range(1, len(index_zero_to_tuas), 2), duty_pms):
+                                   h = index_zero_to_tuas[j]
+                                   h_index = index_zero_to_tuas[j - 1]
+       
+                                   self.PMs_track['city'] -= 1
+       
+                                   self.enter_transit(duty_pm, disc_dt, 'tuas', [h, h_index], 'full', arrival)
+       
+                                   self.check_late(h, j, 'half', disc_dt)
+                                   self.check_late(h_index, j, 'half', disc_dt)
+
+                                   depart_time[h] = disc_dt + 15
+                                   depart_time[h_index] = disc_dt + 15
+                                   self.leave_back_log(h, direction_names[direction[h]], 20)
+                                   self.leave_back_log(h_index, direction_names[direction[h_index]], 20)
        
-              Goal:  I'd say it's to minimize the number of half and empty loads
-                     while trying to maximize full loads.
+                                   self.full_load += 1
        
-              """
-              # creating the headspace in the dataset
-              if headspace != 0:
-                     print('Invalid Dataset Format: Dataset requires resolving!\n')
-                     print('Resolving dataset...')
-                     last_date = df.iat[n - 1, 3]
-                     def add_headspace(multiple, date):
-                            return pd.DataFrame([[-1, 'Neither', 0, date + datetime.timedelta(minutes = 5.0 * multiple), -1]], 
-                                                columns = ['index', 'DIRECTION_shift', 'LEN_Q', 'DISC_DT', 'Connect_SceneC'])
-                     for i in range(1, headspace + 1):
-                            df = df.append(add_headspace(i, last_date))
-                     print('Resolved!\n')
-
-              print('Commencement of Simulation with parameters:\n', 
-                    str(n) + ' Observations with ' + str(headspace) + ' headspace,\n', 
-                    str(bl) + ' Back-log, and\n', 
-                    str(init) + ' for Initialisation')
-              
-              # this is to record the movements of the containers
-              self.container['moved_index'] = [0]*n + ['hs']*headspace
-              self.container['time']['depart'] = [0]*n + ['hs']*headspace
-              self.container['time']['arrive'] = [0]*n + ['hs']*headspace
-              self.container['excess'] = ['0']*n + ['hs']*headspace
        
-              for i in range(bl, n + headspace):
-                     # terminate simulation if all containers have been moved
-                     if 0 not in self.container['moved_index']:
-                            break
-                     
-                     # this is to 'naturally' initialize the variables
-                     if i == init + bl:
-                            # reset tracking after the initialisation iterations
-                            container_bool = np.where(np.asarray(self.container['time']['arrive'][:init + bl + 1]) == 0, False, True)
-                            for i, b in enumerate(container_bool):
-                                   if b:
-                                          self.container['moved_index'][i], self.container['time']['depart'][i], self.container['time']['arrive'][i], self.container['excess'][i] = 'init', 'init', 'init', 'init'
-       
-                            # restarting the tracking of PMs at Tuas, City and Transit
-                            temp = self.transit_track.pop()
-                            self.transit_track.clear()   
-                            self.transit_track.append(temp)
-                            temp = self.tuas_track.pop()
-                            self.tuas_track.clear()
-                            self.tuas_track.append(temp)
-                            temp = self.city_track.pop()
-                            self.city_track.clear()
-                            self.city_track.append(temp)
-       
-                            self.full_load = 0
-                            self.half_load = 0
-                            self.empty_load = 0
-       
-                     # tracking the counts at each location
-                     self.tuas_track.append(self.PMs_track['tuas'])
-                     self.city_track.append(self.PMs_track['city'])
-                     self.transit_track.append(len(self.PMs_track['transit']['time']))
-       
-                     # structure the observation data
-                     going_to, container_size, disc_dt, connect_time = df.iat[i, 1], df.iat[i, 2], df.iat[i, 3], df.iat[i, 4] 
-       
-                     # update the PMs that are on transit, to check if they've reached the other location
-                     transit = self.PMs_track['transit']
-                     if transit['time']: # if there are PMs in transit
-                            # declaring the rest of the variables
-                            transit_time, transit_dest, transit_index, transit_size = transit['time'], transit['dest'], transit['index'], transit['size']
-                            
-                            # getting the duration each PM has been on transit for
-                            trans_updater = [self.get_hours(disc_dt - x) for x in transit_time]
-                            # the function returns a boolean list of the PMs that have returned or not
-                            trans_updater = self.pm_arrival_updater(trans_updater, transit_size, transit_time)
-                            
-                            # update the venues and container
-                            finished_pm_index = [a for a, b in enumerate(trans_updater) if b == False]
-                            for index in finished_pm_index:
-                                   # update location count
-                                   self.PMs_track[transit_dest[index]] += 1
-                                   
-                                   # update PMs
-                                   arrived_pm = [x for x in self.PMs.values() if transit_index[index] in x.work_log['container']][0] # changed
-                                   arrived_pm.location, arrived_pm.current_dest = arrived_pm.current_dest, None
-                                   
-                                   arrived_pm.work_log['arrive'] += [disc_dt]
-       
-                                   # update containers
-                                   if type(transit_index[index]) != str:
-                                          if type(transit_index[index]) == list:
-                                                 arrival_index_1, arrival_index_2 = transit_index[index]
-                                                 self.container['time']['arrive'][arrival_index_1] = disc_dt
-                                                 self.container['excess'][arrival_index_1] = df.iat[arrival_index_1, 4] - self.get_hours(disc_dt - self.container['time']['depart'][arrival_index_1] - datetime.timedelta(minutes = 15))
-       
-                                                 self.container['time']['arrive'][arrival_index_2] = disc_dt
-                                                 self.container['excess'][arrival_index_2] = df.iat[arrival_index_2, 4] - self.get_hours(disc_dt - self.container['time']['depart'][arrival_index_2] - datetime.timedelta(minutes = 15))
-                                          else:
-                                                 arrival_index = transit_index[index]
-                                                 self.container['time']['arrive'][arrival_index] = disc_dt
-                                                 self.container['excess'][arrival_index] = df.iat[arrival_index, 4] - self.get_hours(disc_dt - self.container['time']['depart'][arrival_index] - datetime.timedelta(minutes = 15))
-                            
-                            self.PMs_track['transit']['time'] = list(compress(transit_time, trans_updater))
-                            self.PMs_track['transit']['dest'] = list(compress(transit_dest, trans_updater))
-                            self.PMs_track['transit']['index'] = list(compress(transit_index, trans_updater))
-                            self.PMs_track['transit']['size'] = list(compress(transit_size, trans_updater))
-       
-                     # checking of demand and backlog
-                     # look before
-                     back_log_to_city = sum(df.iloc[[ind for ind, stat in enumerate(self.container['moved_index'][:i]) if stat == 0], 1] == 'EB_City')
-                     back_log_to_tuas = sum(df.iloc[[ind for ind, stat in enumerate(self.container['moved_index'][:i]) if stat == 0], 1] == 'WB_Tuas')
-                     # look after
-                     dd_to_tuas, dd_to_city = 0, 0
-                     dd_present_time, dd_advance_time = disc_dt, disc_dt
-                     count = i + 1
-                     while count < n - 1 and self.get_hours(dd_advance_time - dd_present_time) <= self.forward_dd:
-                            if df.iat[count, 1] == 'EB_City':
-                                   dd_to_city += 1
-                            else:
-                                   dd_to_tuas += 1
-                            count += 1
-                            dd_advance_time = df.iat[count, 3]
-                     self.back_log_track_city.append(back_log_to_city)
-                     self.back_log_track_tuas.append(back_log_to_tuas)
-                     self.dd_track_city.append(dd_to_city)
-                     self.dd_track_tuas.append(dd_to_tuas)
-       
-                     # checking on the number of PMs otw to each location
-                     transit_to_dest = self.get_transit_dest_count()
-                     transit_to_city, transit_to_tuas = transit_to_dest['city'], transit_to_dest['tuas']
-       
-                     # updating of unmoved containers
-                     if 0 in self.container['moved_index'][:i]:
-                            # send the half loads as full loads
-                            if self.PMs_track['city'] + self.PMs_track['tuas'] != 0:
-                                   index_zero = [ind for ind, e in enumerate(self.container['moved_index'][:i]) if e == 0]
-                                   # only handling half containers
-                                   index_zero = [x for x in index_zero if df.iat[x, 2] == 20]
-                                   
-                                   index_zero_to_tuas = [x for x in index_zero if df.iat[x, 1] == 'WB_Tuas'] 
-                                   
-                                   # sort by connection time remaining (shortest to longest)
-                                   index_zero_to_tuas.sort(key = lambda x: df.iat[x, 4] - self.get_hours(disc_dt - df.iat[x, 3])) 
-                                   
-                                   index_zero_to_city = [x for x in index_zero if df.iat[x, 1] == 'EB_City']
-                                   # sort by connection time remaining (shortest to longest)
-                                   index_zero_to_city.sort(key = lambda x: df.iat[x, 4] - self.get_hours(disc_dt - df.iat[x, 3])) 
-                                   
-                                   if index_zero_to_tuas:
-                                          for j in range(1, len(index_zero_to_tuas), 2):
-                                                 h = index_zero_to_tuas[j]
-                                                 h_index = index_zero_to_tuas[j - 1]
-                                                 
-                                                 duty_pm = self.check_pm_avail(disc_dt, 'tuas', 'full')
-                                                 if self.PMs_track['city'] > 0 and duty_pm:
-                                                        # update duty_pm
-                                                        duty_pm.location = 'transit'
-                                                        duty_pm.current_dest = 'tuas'
-                                                        duty_pm.trips_count['full'] += 1
-                                                        duty_pm.trips_count['dest'] += ['tuas']
-                                                        duty_pm.work_log['depart'] += [disc_dt]
-                                                        duty_pm.work_log['container'] += [[h, h_index]]
+                     if index_zero_to_city:
+                            # a PM for each pair, for as long as there are PMs at tuas
+                            pairs = [(index_zero_to_city[j], index_zero_to_city[j - 1]) for j in range(1, len(index_zero_to_city), 2)]
+                            duty_pms = self.allocate_pms(disc_dt, 'city', 'full', pairs[:max(self.PMs_track['tuas'], 0)])
+                            # the PMs of a batch leave together with the same load size, so they're due at the same time
+                            arrival = self.transit_due('full', disc_dt)
+                            for j, duty_pm in zip(range(1, len(index_zero_to_city), 2), duty_pms):
+                                   h = index_zero_to_city[j]
+                                   h_index = index_zero_to_city[j - 1]
        
-                                                        self.PMs_track['city'] -= 1
+                                   self.PMs_track['tuas'] -= 1
        
-                                                        self.PMs_track['transit']['time'] += [disc_dt]
-                                                        self.PMs_track['transit']['dest'] += ['tuas']
-                                                        self.PMs_track['transit']['index'] += [[h, h_index]]
-                                                        self.PMs_track['transit']['size'] += ['full']
+                                   self.enter_transit(duty_pm, disc_dt, 'city', [h, h_index], 'full', arrival)
        
-                                                        if df.iat[j, 4] - self.get_hours(disc_dt - df.iat[j, 3]) <= self.travel_duration('half', disc_dt):
-                                                               self.container['moved_index'][h] = 'Late'
-                                                        else:
-                                                               self.container['moved_index'][h] = 1
-                                                               
-                                                        if df.iat[j, 4] - self.get_hours(disc_dt - df.iat[j, 3]) <= self.travel_duration('half', disc_dt):
-                                                               self.container['moved_index'][h_index] = 'Late'
-                                                        else:
-                                                               self.container['moved_index'][h_index] = 1
-
-                                                        self.container['time']['depart'][h] = disc_dt + datetime.timedelta(minutes = 15)
-                                                        self.container['time']['depart'][h_index] = disc_dt + datetime.timedelta(minutes = 15)
+                                   self.check_late(h, j, 'half', disc_dt)
+                                   self.check_late(h_index, j, 'half', disc_dt)
        
-                                                        self.full_load += 1
-                                                 
-                                                 # if there're no more PMs available at city, just break the loop
-                                                 if self.PMs_track['city'] == 0:
-                                                        break
-                                                 
-                                          
-                                   if index_zero_to_city:
-                                          for j in range(1, len(index_zero_to_city), 2):
-                                                 h = index_zero_to_city[j]
-                                                 h_index = index_zero_to_city[j - 1]
-                                                 
-                                                 duty_pm = self.check_pm_avail(disc_dt, 'city', 'full')
-                                                 if self.PMs_track['tuas'] > 0 and duty_pm:
-                                                        # update duty_pm
-                                                        duty_pm.location = 'transit'
-                                                        duty_pm.current_dest = 'city'
-                                                        duty_pm.trips_count['full'] += 1
-                                                        duty_pm.trips_count['dest'] += ['city']
-                                                        duty_pm.work_log['depart'] += [disc_dt]
-                                                        duty_pm.work_log['container'] += [[h, h_index]]
-                                                        
-                                                        self.PMs_track['tuas'] -= 1
-                                                        
-                                                        self.PMs_track['transit']['time'] += [disc_dt]
-                                                        self.PMs_track['transit']['dest'] += ['city']
-                                                        self.PMs_track['transit']['index'] += [[h, h_index]]
-                                                        self.PMs_track['transit']['size'] += ['full']
-                                                        
-                                                        if df.iat[j, 4] - self.get_hours(disc_dt - df.iat[j, 3]) <= self.travel_duration('half', disc_dt):
-                                                               self.container['moved_index'][h] = 'Late'
-                                                        else:
-                                                               self.container['moved_index'][h] = 1
-                                                               
-                                                        if df.iat[j, 4] - self.get_hours(disc_dt - df.iat[j, 3]) <= self.travel_duration('half', disc_dt):
-                                                               self.container['moved_index'][h_index] = 'Late'
-                                                        else:
-                                                               self.container['moved_index'][h_index] = 1
-                                                               
-                                                        self.container['time']['depart'][h] = disc_dt + datetime.timedelta(minutes = 15)
-                                                        self.container['time']['depart'][h_index] = disc_dt + datetime.timedelta(minutes = 15)
+                                   depart_time[h] = disc_dt + 15
+                                   depart_time[h_index] = disc_dt + 15
+                                   self.leave_back_log(h, direction_names[direction[h]], 20)
+                                   self.leave_back_log(h_index, direction_names[direction[h_index]], 20)
        
-                                                        self.full_load += 1
-                                                        
-                                                 # if there're no more PMs available at tuas, just break the loop
-                                                 if self.PMs_track['tuas'] == 0:
-                                                        break
-                                                 
-                            # look for the indexes of the containers that haven't been moved
-                            index_zero = [ind for ind, e in enumerate(self.container['moved_index'][:i]) if e == 0]
-                            
-                            # sort based on connection time (shortest to longest)
-                            index_zero.sort(key = lambda x: df.iat[x, 4] - self.get_hours(disc_dt - df.iat[x, 3]))
-                            
-                            # based on the container indexes, i look up its information based on the dataframe
-                            for j in index_zero:
-                                   # will settle the container that has the shortest connection time remaining (from the current time of pm activation to load_dt)       
-                                   zero_going_to, zero_container_size, zero_disc_dt, zero_connect_time = df.iat[j, 1], df.iat[j, 2], df.iat[j, 3], df.iat[j, 4]
-                                   
-                                   # while updating the connection time based on when it arrived to the port till the time we can activate a PM to send it
-                                   zero_connect_time = zero_connect_time - self.get_hours(disc_dt - zero_disc_dt)
-                                   if zero_container_size >= 22:
-                                          zero_container_size = 'full'
-                                   else:
-                                          zero_container_size = 'half'
-       
-                                   # if it's a full load or there's not much time left, we just activate an available PM (if there are any) to send it over
-                                   if zero_connect_time < self.threshold_connectingtime or zero_container_size == 'full':
-                                          if zero_going_to == 'EB_City':
-                                                 # get a PM
-                                                 duty_pm = self.check_pm_avail(disc_dt, 'city', zero_container_size)
-                                                 if self.PMs_track['tuas'] > 0 and duty_pm:
-                                                        # update duty_pm
-                                                        duty_pm.location = 'transit'
-                                                        duty_pm.current_dest = 'city'
-                                                        duty_pm.trips_count[zero_container_size] += 1
-                                                        duty_pm.trips_count['dest'] += ['city']
-                                                        duty_pm.work_log['depart'] += [disc_dt]
-                                                        duty_pm.work_log['container'] += [j]
+                                   self.full_load += 1
        
-                                                        self.PMs_track['tuas'] -= 1
+              # look for the indexes of the containers that haven't been moved, sorted based on connection time (shortest to longest)
+              index_zero = self.back_log_order()
        
-                                                        self.PMs_track['transit']['time'] += [disc_dt]
-                                                        self.PMs_track['transit']['dest'] += ['city']
-                                                        self.PMs_track['transit']['index'] += [j]
-                                                        self.PMs_track['transit']['size'] += [zero_container_size]
-
-                                                        # if we missed it, we mark as Late
-                                                        if zero_connect_time <= self.travel_duration(zero_container_size, disc_dt):
-                                                               self.container['moved_index'][j] = 'Late'
-                                                        else:
-                                                               self.container['moved_index'][j] = 1
-                                                        self.container['time']['depart'][j] = disc_dt + datetime.timedelta(minutes = 15)
-                                                        if zero_container_size == 'full':
-                                                               self.full_load += 1
-                                                        else:
-                                                               self.half_load += 1
-                                          # going tuas
-                                          else:
-                                                 # get a PM
-                                                 duty_pm = self.check_pm_avail(disc_dt, 'tuas', zero_container_size)
-                                                 if self.PMs_track['city'] > 0 and duty_pm:
-                                                        # update duty_pm
-                                                        duty_pm.location = 'transit'
-                                                        duty_pm.current_dest = 'tuas'
-                                                        duty_pm.trips_count[zero_container_size] += 1
-                                                        duty_pm.trips_count['dest'] += ['tuas']
-                                                        duty_pm.work_log['depart'] += [disc_dt]
-                                                        duty_pm.work_log['container'] += [j]
+              # based on the container indexes, i look up its information based on the scenario data
+              for j in index_zero:
+                     # will settle the container that has the shortest connection time remaining (from the current time of pm activation to load_dt)       
+                     zero_going_to, zero_container_size, zero_disc_dt, zero_connect_time = direction_names[direction[j]], size[j], disc_min[j], connect[j]
        
-                                                        self.PMs_track['city'] -= 1
+                     # while updating the connection time based on when it arrived to the port till the time we can activate a PM to send it
+                     zero_connect_time = zero_connect_time - self.minutes_to_hours(disc_dt - zero_disc_dt)
+                     if zero_container_size >= 22:
+                            zero_container_size = 'full'
+                     else:
+                            zero_container_size = 'half'
        
-                                                        self.PMs_track['transit']['time'] += [disc_dt]
-                                                        self.PMs_track['transit']['dest'] += ['tuas']
-                                                        self.PMs_track['transit']['index'] += [j]
-                                                        self.PMs_track['transit']['size'] += [zero_container_size]
-       
-                                                        # if we missed it, we mark as Late
-                                                        if zero_connect_time <= self.travel_duration(zero_container_size, disc_dt):
-                                                               self.container['moved_index'][j] = 'Late'
-                                                        else:
-                                                               self.container['moved_index'][j] = 1
-                                                        self.container['time']['depart'][j] = disc_dt + datetime.timedelta(minutes = 15)
-                                                        if zero_container_size == 'full':
-                                                               self.full_load += 1
-                                                        else:
-                                                               self.half_load += 1
-                                   
-                                   # no point settling backlog if there're no more available PMs on either side
-                                   if self.PMs_track['city'] + self.PMs_track['tuas'] == 0:
-                                          break
-       
-                     # for full length containers
-                     if container_size > 22:
-                            # initiate PM
-                            if going_to == 'EB_City':
+                     # if it's a full load or there's not much time left, we just activate an available PM (if there are any) to send it over
+                     if zero_connect_time < self.threshold_connectingtime or zero_container_size == 'full':
+                            if zero_going_to == 'EB_City':
                                    # get a PM
-                                   duty_pm = self.check_pm_avail(disc_dt, 'city', 'full')
-                                   if self.PMs_track['tuas'] > 0 and duty_pm:
-                                          # update duty_pm
-                                          duty_pm.location = 'transit'
-                                          duty_pm.current_dest = 'city'
-                                          duty_pm.trips_count['full'] += 1
-                                          duty_pm.trips_count['dest'] += ['city']
-                                          duty_pm.work_log['depart'] += [disc_dt]
-                                          duty_pm.work_log['container'] += [i]
+                                   if self.PMs_track['tuas'] > 0:
+                                          for duty_pm in self.allocate_pms(disc_dt, 'city', zero_container_size, [(j, -1)]):
+                                                 self.PMs_track['tuas'] -= 1
        
+                                                 self.enter_transit(duty_pm, disc_dt, 'city', j, zero_container_size)
+
+                                                 # if we missed it, we mark as Late
+                                                 self.check_late(j, j, zero_container_size, disc_dt)
+                                                 depart_time[j] = disc_dt + 15
+                                                 self.leave_back_log(j, zero_going_to, size[j])
+                                                 if zero_container_size == 'full':
+                                                        self.full_load += 1
+                                                 else:
+                                                        self.half_load += 1
+                            # going tuas
+                            else:
+                                   # get a PM
+                                   if self.PMs_track['city'] > 0:
+                                          for duty_pm in self.allocate_pms(disc_dt, 'tuas', zero_container_size, [(j, -1)]):
+                                                 self.PMs_track['city'] -= 1
+       
+                                                 self.enter_transit(duty_pm, disc_dt, 'tuas', j, zero_container_size)
+       
+                                                 # if we missed it, we mark as Late
+                                                 self.check_late(j, j, zero_container_size, disc_dt)
+                                                 depart_time[j] = disc_dt + 15
+                                                 self.leave_back_log(j, zero_going_to, size[j])
+                                                 if zero_container_size == 'full':
+                                                        self.full_load += 1
+                                                 else:
+                                                        self.half_load += 1
+       
+                     # no point settling backlog if there're no more available PMs on either side
+                     if self.PMs_track['city'] + self.PMs_track['tuas'] == 0:
+                            break
+
+       def dispatch_container(self, i, dd_to_city, dd_to_tuas):
+              """
+              function:     sends off the container of observation i if there's a PM for it; full length containers
+                            on their own, half length containers with the earliest half length one in the back log going
+                            the same way, or on their own when it's urgent
+              input:        index of the observation and the demand that's coming up towards city and tuas
+              output:       None. Updates the state of the simulation
+              """
+              depart_time = self.container['depart']
+              columns = self.column_lists
+              going_to, container_size, disc_dt, connect_time = self.direction_names[columns['direction'][i]], columns['size'][i], columns['disc_dt'][i], columns['connect_time'][i]
+              # for full length containers
+              if container_size > 22:
+                     # initiate PM
+                     if going_to == 'EB_City':
+                            # get a PM
+                            if self.PMs_track['tuas'] > 0:
+                                   for duty_pm in self.allocate_pms(disc_dt, 'city', 'full', [(i, -1)]):
                                           self.PMs_track['tuas'] -= 1
        
-                                          self.PMs_track['transit']['time'] += [disc_dt]
-                                          self.PMs_track['transit']['dest'] += ['city']
-                                          self.PMs_track['transit']['index'] += [i]
-                                          self.PMs_track['transit']['size'] += ['full']
+                                          self.enter_transit(duty_pm, disc_dt, 'city', i, 'full')
        
-                                          self.container['moved_index'][i] = 1
-                                          self.container['time']['depart'][i] = disc_dt + datetime.timedelta(minutes = 15)
+                                          self.set_container_status(i, self.MOVED)
+                                          depart_time[i] = disc_dt + 15
        
                                           self.full_load += 1
-                            else:
-                                   # get a PM
-                                   duty_pm = self.check_pm_avail(disc_dt, 'tuas', 'full')
-                                   if self.PMs_track['city'] > 0 and duty_pm:
-                                          # update duty_pm
-                                          duty_pm.location = 'transit'
-                                          duty_pm.current_dest = 'tuas'
-                                          duty_pm.trips_count['full'] += 1
-                                          duty_pm.trips_count['dest'] += ['tuas']
-                                          duty_pm.work_log['depart'] += [disc_dt]
-                                          duty_pm.work_log['container'] += [i]
-       
+                     else:
+                            # get a PM
+                            if self.PMs_track['city'] > 0:
+                                   for duty_pm in self.allocate_pms(disc_dt, 'tuas', 'full', [(i, -1)]):
                                           self.PMs_track['city'] -= 1
        
-                                          self.PMs_track['transit']['time'] += [disc_dt]
-                                          self.PMs_track['transit']['dest'] += ['tuas']
-                                          self.PMs_track['transit']['index'] += [i]
-                                          self.PMs_track['transit']['size'] += ['full']
+                                          self.enter_transit(duty_pm, disc_dt, 'tuas', i, 'full')
        
-                                          self.container['moved_index'][i] = 1
-                                          self.container['time']['depart'][i] = disc_dt + datetime.timedelta(minutes = 15)
+                                          self.set_container_status(i, self.MOVED)
+                                          depart_time[i] = disc_dt + 15
        
                                           self.full_load += 1
        
-                     # for half length containers
-                     elif container_size > 0:
-                            # finding other half loads that are available
-                            index, index_going_to, index_container_size = None, None, None
-                            if 0 in self.container['moved_index'][:i]:
-                                   # search for the first 0 then start from there. so we slice from [first zero index:i] (can be O(logn))
-                                   # settling any prior container of size 20 that's yet to be shipped
-                                   index_twenties = [j for j, e in enumerate(self.container['moved_index'][:i]) if e == 0]
-                                   l = len(index_twenties)
-                                   index_twenties = iter(index_twenties)
-                                   for c in range(l): 
-                                          c_i = next(index_twenties)
-                                          # index_obs = df.iloc[c_i, :]
-                                          index, index_going_to, index_container_size = c_i, df.iat[c_i, 1], df.iat[c_i, 2]
-                                          if index_going_to == going_to and index_container_size <= 22:
-                                                 break
-       
-                            # if there are other half loads available
-                            if index_going_to == going_to and index_container_size <= 22:
-                                   if going_to == 'EB_City':
-                                          # get a PM
-                                          duty_pm = self.check_pm_avail(disc_dt, 'city', 'full')
-                                          if self.PMs_track['tuas'] > 0 and duty_pm:
-                                                 # update duty_pm
-                                                 duty_pm.location = 'transit'
-                                                 duty_pm.current_dest = 'city'
-                                                 duty_pm.trips_count['full'] += 1
-                                                 duty_pm.trips_count['dest'] += ['city']
-                                                 duty_pm.work_log['depart'] += [disc_dt]
-                                                 duty_pm.work_log['container'] += [[i, index]]
-       
+              # for half length containers
+              elif container_size > 0:
+                     # finding other half loads that are available
+                     index, index_going_to, index_container_size = None, None, None
+                     # settling the earliest prior half length container going the same way that's yet to be shipped
+                     if self.half_pending.get(going_to):
+                            index, index_container_size = next(iter(self.half_pending[going_to].items()))
+                            index_going_to = going_to
+       
+                     # if there are other half loads available
+                     if index_going_to == going_to and index_container_size <= 22:
+                            if going_to == 'EB_City':
+                                   # get a PM
+                                   if self.PMs_track['tuas'] > 0:
+                                          for duty_pm in self.allocate_pms(disc_dt, 'city', 'full', [(i, index)]):
                                                  self.PMs_track['tuas'] -= 1
        
-                                                 self.PMs_track['transit']['time'] += [disc_dt]
-                                                 self.PMs_track['transit']['dest'] += ['city']
-                                                 self.PMs_track['transit']['index'] += [[i, index]]
-                                                 self.PMs_track['transit']['size'] += ['full']
+                                                 self.enter_transit(duty_pm, disc_dt, 'city', [i, index], 'full')
        
-                                                 self.container['moved_index'][i] = 1
-                                                 self.container['moved_index'][index] = 1
-                                                 self.container['time']['depart'][i] = disc_dt + datetime.timedelta(minutes = 15)
-                                                 self.container['time']['depart'][index] = disc_dt + datetime.timedelta(minutes = 15)
+                                                 self.set_container_status(i, self.MOVED)
+                                                 self.set_container_status(index, self.MOVED)
+                                                 depart_time[i] = disc_dt + 15
+                                                 depart_time[index] = disc_dt + 15
+                                                 self.leave_back_log(index, going_to, index_container_size)
        
                                                  self.full_load += 1
-                                   else:
-                                          # get a PM
-                                          duty_pm = self.check_pm_avail(disc_dt, 'tuas', 'full')
-                                          if self.PMs_track['city'] > 0 and duty_pm:
-                                                 duty_pm.location = 'transit'
-                                                 duty_pm.current_dest = 'tuas'
-                                                 duty_pm.trips_count['full'] += 1
-                                                 duty_pm.trips_count['dest'] += ['tuas']
-                                                 duty_pm.work_log['depart'] += [disc_dt]
-                                                 duty_pm.work_log['container'] += [[i, index]]
-       
+                            else:
+                                   # get a PM
+                                   if self.PMs_track['city'] > 0:
+                                          for duty_pm in self.allocate_pms(disc_dt, 'tuas', 'full', [(i, index)]):
                                                  self.PMs_track['city'] -= 1
        
-                                                 self.PMs_track['transit']['time'] += [disc_dt]
-                                                 self.PMs_track['transit']['dest'] += ['tuas']
-                                                 self.PMs_track['transit']['index'] += [[i, index]]
-                                                 self.PMs_track['transit']['size'] += ['full']
+                                                 self.enter_transit(duty_pm, disc_dt, 'tuas', [i, index], 'full')
        
-                                                 self.container['moved_index'][i] = 1
-                                                 self.container['moved_index'][index] = 1
-                                                 self.container['time']['depart'][i] = disc_dt + datetime.timedelta(minutes = 15)
-                                                 self.container['time']['depart'][index] = disc_dt + datetime.timedelta(minutes = 15)
+                                                 self.set_container_status(i, self.MOVED)
+                                                 self.set_container_status(index, self.MOVED)
+                                                 depart_time[i] = disc_dt + 15
+                                                 depart_time[index] = disc_dt + 15
+                                                 self.leave_back_log(index, going_to, index_container_size)
        
                                                  self.full_load += 1
        
-                            # if there're no other half loads available
-                            else:
-                                   if going_to == 'EB_City':
-                                          if (self.PMs_track[going_to[3:].lower()] < self.threshold_vehicle_half and dd_to_tuas > self.threshold_dd) or connect_time < self.threshold_connectingtime: 
-                                                 # get a PM
-                                                 duty_pm = self.check_pm_avail(disc_dt, 'city', 'half')
-                                                 if self.PMs_track['tuas'] > 0 and duty_pm:
-                                                        # update duty_pm
-                                                        duty_pm.location = 'transit'
-                                                        duty_pm.current_dest = 'city'
-                                                        duty_pm.trips_count['half'] += 1
-                                                        duty_pm.trips_count['dest'] += ['city']
-                                                        duty_pm.work_log['depart'] += [disc_dt]
-                                                        duty_pm.work_log['container'] += [i]
-       
+                     # if there're no other half loads available
+                     else:
+                            if going_to == 'EB_City':
+                                   if (self.PMs_track[going_to[3:].lower()] < self.threshold_vehicle_half and dd_to_tuas > self.threshold_dd) or connect_time < self.threshold_connectingtime: 
+                                          # get a PM
+                                          if self.PMs_track['tuas'] > 0:
+                                                 for duty_pm in self.allocate_pms(disc_dt, 'city', 'half', [(i, -1)]):
                                                         self.PMs_track['tuas'] -= 1
        
-                                                        self.PMs_track['transit']['time'] += [disc_dt]
-                                                        self.PMs_track['transit']['dest'] += ['city']
-                                                        self.PMs_track['transit']['index'] += [i]
-                                                        self.PMs_track['transit']['size'] += ['half']
+                                                        self.enter_transit(duty_pm, disc_dt, 'city', i, 'half')
        
-                                                        self.container['moved_index'][i] = 1
-                                                        self.container['time']['depart'][i] = disc_dt + datetime.timedelta(minutes = 15)
+                                                        self.set_container_status(i, self.MOVED)
+                                                        depart_time[i] = disc_dt + 15
                                                         self.half_load += 1
-                                   else:
-                                          if (self.PMs_track[going_to[3:].lower()] < self.threshold_vehicle_half and dd_to_city > self.threshold_dd) or connect_time < self.threshold_connectingtime:
-                                                 # get a PM
-                                                 duty_pm = self.check_pm_avail(disc_dt, 'tuas', 'half')
-                                                 if self.PMs_track['city'] > 0 and duty_pm:
-                                                        # update duty_pm
-                                                        duty_pm.location = 'transit'
-                                                        duty_pm.current_dest = 'tuas'
-                                                        duty_pm.trips_count['half'] += 1
-                                                        duty_pm.trips_count['dest'] += ['tuas']
-                                                        duty_pm.work_log['depart'] += [disc_dt]
-                                                        duty_pm.work_log['container'] += [i]
-       
+                            else:
+                                   if (self.PMs_track[going_to[3:].lower()] < self.threshold_vehicle_half and dd_to_city > self.threshold_dd) or connect_time < self.threshold_connectingtime:
+                                          # get a PM
+                                          if self.PMs_track['city'] > 0:
+                                                 for duty_pm in self.allocate_pms(disc_dt, 'tuas', 'half', [(i, -1)]):
                                                         self.PMs_track['city'] -= 1
        
-                                                        self.PMs_track['transit']['time'] += [disc_dt]
-                                                        self.PMs_track['transit']['dest'] += ['tuas']
-                                                        self.PMs_track['transit']['index'] += [i]
-                                                        self.PMs_track['transit']['size'] += ['half']
+                                                        self.enter_transit(duty_pm, disc_dt, 'tuas', i, 'half')
        
-                                                        self.container['moved_index'][i] = 1
-                                                        self.container['time']['depart'][i] = disc_dt + datetime.timedelta(minutes = 15)
+                                                        self.set_container_status(i, self.MOVED)
+                                                        depart_time[i] = disc_dt + 15
                                                         self.half_load += 1
+
+       def move_empty_pms(self, i, dd_to_city, dd_to_tuas, back_log_to_city, back_log_to_tuas, transit_to_city, transit_to_tuas):
+              """
+              function:     moves empty PMs over to a location that's running low on PMs while its demand or back log is high
+              input:        index of the observation, the demand and back log towards city and tuas, and the PMs on
+                            their way to city and tuas
+              output:       None. Updates the state of the simulation
+              """
+              disc_dt = self.column_lists['disc_dt'][i]
+              # sending empty PMs to city
+              if (dd_to_tuas > self.threshold_dd_empty or back_log_to_tuas > self.threshold_back_log) and (self.PMs_track['city'] + transit_to_city <= self.threshold_empty_movement):
+                     if self.PMs_track['tuas'] >= self.threshold_vehicle_half:
+                            # get up to move_over PMs at once
+                            duty_pms = self.allocate_pms(disc_dt, 'city', 'empty', [(p, i) for p in range(self.move_over)])
+                            arrival = self.transit_due('empty', disc_dt)
+                            for p, duty_pm in enumerate(duty_pms):
+                                   self.PMs_track['tuas'] -= 1
+       
+                                   self.enter_transit(duty_pm, disc_dt, 'city', 'empty' + str(p) + '|' + str(i), 'empty', arrival)
+       
+                                   self.empty_load += self.move_over
+       
+              # sending empty PMs to tuas
+              if (dd_to_city > self.threshold_dd_empty or back_log_to_city > self.threshold_back_log) and (self.PMs_track['tuas'] + transit_to_tuas <= self.threshold_empty_movement):
+                     if self.PMs_track['city'] >= self.threshold_vehicle_half:
+                            # get up to move_over PMs at once
+                            duty_pms = self.allocate_pms(disc_dt, 'tuas', 'empty', [(i, p) for p in range(self.move_over)])
+                            arrival = self.transit_due('empty', disc_dt)
+                            for p, duty_pm in enumerate(duty_pms):
+                                   self.PMs_track['city'] -= 1
+       
+                                   self.enter_transit(duty_pm, disc_dt, 'city', 'empty' + str(i) + '|' + str(p), 'empty', arrival)
+       
+                                   self.empty_load += self.move_over
+
+       def show_progress(self, i):
+              """
+              function:     the loading bar, shown at every 10% of the observations
+              input:        index of the observation
+              output:       None. Prints the loading bar
+              """
+              if self.diagnostics and i in self.progress_marks:
+                     prop_done = self.progress_marks.index(i)
+                     print('[' + '###'*prop_done + '   '*(10 - prop_done) + ']' + '  ' + str(prop_done*10) + '% done')
+
+       def run_loop(self):
+              """
+              function:     the per observation engine; goes through the observations one at a time, in order. time
+                            only moves on at each discharge
+              input:        None
+              output:       None. Runs the simulation
+              """
+              for i in range(self.bl, self.n + self.headspace):
+                     # terminate simulation if all containers have been moved
+                     if self.pending_count == 0:
+                            break
+                     self.observe(i)
+                     self.show_progress(i)
+
+       def run_ticks(self):
+              """
+              function:     the tick engine; the observations that share the same DISC_DT are discharged together in
+                            one tick. the PMs' arrivals, the demand, the back log and the tracking are looked at once
+                            per tick instead of once per observation, and empty PMs are moved over after the tick's
+                            containers are sent off
+              input:        None
+              output:       None. Runs the simulation
+              """
+              edges = self.tick_edges()
+              for i, tick_end in zip(edges[:-1], edges[1:]):
+                     # terminate simulation if all containers have been moved
+                     if self.pending_count == 0:
+                            break
+                     self.observe(i, tick_end)
+                     for j in range(i, tick_end):
+                            self.show_progress(j)
+
+       def tick_edges(self):
+              """
+              function:     where the ticks of the tick engine start; wherever DISC_DT changes, and at the end of the
+                            initialisation
+              input:        None
+              output:       sorted list of the first observation of each tick, and the index after the last observation
+              """
+              disc_min = self.columns['disc_dt']
+              first, last = self.bl, self.n + self.headspace
+              edges = set((first + 1 + np.flatnonzero(np.diff(disc_min[first:last]) != 0)).tolist())
+              edges.update([first, last])
+              if first < self.init + self.bl < last:
+                     edges.add(self.init + self.bl)
+              return sorted(edges)
+
+       def run_events(self, arrival_events = True, shift_events = True):
+              """
+              function:     the event engine; a single queue of the discharges of the observations, the arrivals of 
+                            the PMs at the time they're due, and the boundaries of the half hour slots where PMs go on or
+                            off work (shifts and meals). an arrival or boundary settles the back log there and then, 
+                            instead of waiting for the next discharge. with neither of them, it's the same as run_loop
+              input:        whether to have arrival events, and whether to have shift/meal boundary events
+              output:       None. Runs the simulation
+              """
+              disc_min = self.column_lists['disc_dt']
+              first, last = self.bl, self.n + self.headspace
+              if first >= last:
+                     return
+              self.events = EventQueue()
+              self.arrival_events = arrival_events
+              self.events.push(disc_min[first], EventQueue.DISCHARGE, first)
+              # the slots where some PMs go on or off work, and the last timing to look at them
+              boundaries = np.flatnonzero((self.pm_calendar != np.roll(self.pm_calendar, 1, axis = 1)).any(axis = 0))*30
+              end = max(disc_min[first:last]) + 24*60
+              if shift_events and len(boundaries):
+                     self.events.push(self.next_boundary(disc_min[first], boundaries), EventQueue.BOUNDARY)
+              next_i = first # the next observation to be discharged
+              while len(self.events):
+                     # terminate simulation if all containers have been moved
+                     if self.pending_count == 0:
+                            break
+                     timing, kind, i = self.events.pop()
+                     if kind == EventQueue.DISCHARGE:
+                            self.observe(i)
+                            self.show_progress(i)
+                            next_i = i + 1
+                            if next_i < last:
+                                   self.events.push(disc_min[next_i], EventQueue.DISCHARGE, next_i)
+                     elif kind == EventQueue.ARRIVAL:
+                            if self.arrive_pms(timing) and self.oldest_pending < next_i:
+                                   self.settle_back_log(timing)
+                     else:
+                            if self.oldest_pending < next_i:
+                                   self.settle_back_log(timing)
+                            if timing < end:
+                                   self.events.push(self.next_boundary(timing, boundaries), EventQueue.BOUNDARY)
+              self.events = None
+
+       def next_boundary(self, timing, boundaries):
+              """
+              function:     the next boundary of a half hour slot where PMs go on or off work
+              input:        the current timing (minutes since the epoch) and the boundaries within a day (minutes after midnight)
+              output:       timing of the next boundary, after the current timing
+              """
+              day, minute = divmod(int(timing), 24*60)
+              later = boundaries[boundaries > minute]
+              return day*24*60 + int(later[0]) if len(later) else (day + 1)*24*60 + int(boundaries[0])
+
+       def prepare_data(self, df, n, headspace):
+              """
+              function:     pulls the scenario data out into arrays (with the headspace), along with what's worked out 
+                            from it before a run; the deadline of each container and the running count of the containers
+                            going to city. none of it changes during a run, so it can be shared by the simulations of a Sweep
+              input:        scenario data in the form of a dataframe, number of observations and the amount of headspace
+              output:       dictionary of 'columns' (arrays), 'column_lists' (the same as lists), 'direction_names', 'epoch',
+                            'deadline' and 'city_count'
+              """
+              # the scenario data as arrays; the dataframe isn't read again during the simulation.
+              # all timings are kept as minutes since self.epoch, and only converted back to datetimes for the results
+              columns = self.add_headspace(self.extract_columns(df), n, headspace)
+              direction, disc_min, connect = columns['direction'], columns['disc_dt'], columns['connect_time']
+
+              # deadline of each container (DISC_DT + connection time), to order the back log by
+              deadline = (disc_min*60*(10**9) + np.round(connect*3600*(10**9)).astype('int64')).tolist()
+
+              # for looking ahead at the demand: a running count of the containers going to city
+              to_city = np.array([name == 'EB_City' for name in self.direction_names])[direction[:n]]
+              city_count = [0] + np.cumsum(to_city).tolist()
+              return {'columns': columns, 'column_lists': {name: values.tolist() for name, values in columns.items()},
+                      'direction_names': self.direction_names, 'epoch': self.epoch, 'deadline': deadline, 'city_count': city_count}
+
+       def start_run(self, data, n, headspace, bl, init, deferred = False, track_bucket = None, diagnostics = True, container = None):
+              """
+              function:     sets the simulation up for a run over the scenario data (see simulate_shifting for the inputs)
+              input:        the scenario data from prepare_data, number of observations, the amount of headspace, back log 
+                            and initialisation, whether the settling is deferred, the length of the tracking buckets, whether 
+                            to run with diagnostics, and the record of the containers to use (a new one if None)
+              output:       None. Resets the state of the simulation for the run
+              """
+              self.diagnostics = diagnostics
+              self.fleet.logging = diagnostics
+
+              # this is to record the movements of the containers
+              self.container = self.container_store(n, headspace) if container is None else container
+              self.pending_count = n
+              self.oldest_pending = 0
+              self.deferred = deferred
+              self.late_checks = []
+              self.slack = None
+
+              # the PMs could have been changed (shifts, working hours) since they were created
+              self.build_pm_avail()
+
+              # the arrays are for working on many containers at once, and the lists for reading one value at a time
+              columns = self.columns = data['columns']
+              self.column_lists = data['column_lists']
+              direction, size = self.column_lists['direction'], self.column_lists['size']
+              disc_min = columns['disc_dt']
+              direction_names = self.direction_names = data['direction_names']
+              self.epoch = data['epoch']
+              for pm in self.PMs.values():
+                     pm.epoch = self.epoch
+
+              # tracking of the PMs, demand and back log, either at every iteration or in buckets of DISC_DT
+              if not diagnostics:
+                     self.reset_tracks(0)
+              elif track_bucket is None or bl >= n + headspace:
+                     self.reset_tracks(max(n + headspace - bl, 0))
+              else:
+                     horizon = disc_min[bl:n + headspace]
+                     self.reset_tracks(0, track_bucket, int(horizon.min()), int(horizon.max()))
+
+              self.deadline = data['deadline']
+
+              # the observations before `bl` start off as the back log
+              self.back_log_count = {'EB_City': 0, 'WB_Tuas': 0}
+              self.back_log_queue = {}
+              self.half_pending = {}
+              for j in range(bl):
+                     self.enter_back_log(j, direction_names[direction[j]], size[j])
+       
+              self.n, self.headspace, self.bl, self.init = n, headspace, bl, init
+              self.city_count = data['city_count']
+              self.demand = DemandWindow(self.column_lists['disc_dt'], self.city_count, n, self.forward_dd, bl)
+              self.progress_marks = list(map(lambda x: floor(x), np.linspace(bl, n - 1, 11)))
+
+       ##################### ACTUAL SIMULATION #########################
+       def simulate_shifting(self, df, n = 1000, headspace = 50, bl = 100, init = 50, deferred = False, track_bucket = None, 
+                             engine = 'loop', arrival_events = None, shift_events = None, diagnostics = True):
+              """
+              function:     simulates the shifting of containers between tuas and city
+              input:        scenario data in the form of a dataframe with only the number of containers that it wants to simulate,
+                            the number of scenario it wants to simulate,
+                            the amount of headspace given to run,
+                            the amount of backlog,
+                            the amount to use for initialisation (something like a seed),
+                            whether to settle the excess and Late status of the containers after the run instead of during it,
+                            the length (minutes of DISC_DT) of the buckets to track the PMs, demand and back log in, or None
+                            to track them at every iteration,
+                            which engine to run; 'loop' (time moves on at each discharge), 'tick' (the discharges at
+                            the same DISC_DT are taken together, see run_ticks) or 'event' (see run_events),
+                            and for the event engine only, whether the PMs' arrivals and the shift/meal boundaries are 
+                            events of their own (both by default; with neither, it gives the same results as the loop),
+                            and whether to run with diagnostics (the trip log, tracking, excess, progress bar, export 
+                            and plots). without, the statuses and loads come out the same
+              returns:      DataFrame [Refer to export_result() function to find out what's being exported] and Plots,
+                            or without diagnostics, a RunSummary of the container statuses and load counts
        
-                     # sending empty PMs to city
-                     if (dd_to_tuas > self.threshold_dd_empty or back_log_to_tuas > self.threshold_back_log) and (self.PMs_track['city'] + transit_to_city <= self.threshold_empty_movement):
-                            if self.PMs_track['tuas'] >= self.threshold_vehicle_half:
-                                   for p in range(self.move_over):
-                                          # get a PM
-                                          duty_pm = self.check_pm_avail(disc_dt, 'city', 'empty')
-                                          if duty_pm:
-                                                 # update duty_pm
-                                                 duty_pm.location = 'transit'
-                                                 duty_pm.current_dest = 'city'
-                                                 duty_pm.trips_count['empty'] += 1
-                                                 duty_pm.trips_count['dest'] += ['city']
-                                                 duty_pm.work_log['depart'] += [disc_dt]
-                                                 duty_pm.work_log['container'] += ['empty' + str(p) + '|' + str(i)]
-       
-                                                 self.PMs_track['tuas'] -= 1
-       
-                                                 self.PMs_track['transit']['time'] += [disc_dt]
-                                                 self.PMs_track['transit']['dest'] += ['city']
-                                                 self.PMs_track['transit']['index'] += ['empty' + str(p) + '|' + str(i)]
-                                                 self.PMs_track['transit']['size'] += ['empty']
-       
-                                                 self.empty_load += self.move_over
-                     
-                     # sending empty PMs to tuas
-                     if (dd_to_city > self.threshold_dd_empty or back_log_to_city > self.threshold_back_log) and (self.PMs_track['tuas'] + transit_to_tuas <= self.threshold_empty_movement):
-                            if self.PMs_track['city'] >= self.threshold_vehicle_half:
-                                   for p in range(self.move_over):
-                                          # get a PM
-                                          duty_pm = self.check_pm_avail(disc_dt, 'tuas', 'empty')
-                                          if duty_pm:
-                                                 # update duty_pm
-                                                 duty_pm.location = 'transit'
-                                                 duty_pm.current_dest = 'tuas'
-                                                 duty_pm.trips_count['empty'] += 1
-                                                 duty_pm.trips_count['dest'] += ['tuas']
-                                                 duty_pm.work_log['depart'] += [disc_dt]
-                                                 duty_pm.work_log['container'] += ['empty' + str(i) + '|' + str(p)]
-       
-                                                 self.PMs_track['city'] -= 1
+              Goal:  I'd say it's to minimize the number of half and empty loads
+                     while trying to maximize full loads.
        
-                                                 self.PMs_track['transit']['time'] += [disc_dt]
-                                                 self.PMs_track['transit']['dest'] += ['city']
-                                                 self.PMs_track['transit']['index'] += ['empty' + str(i) + '|' + str(p)]
-                                                 self.PMs_track['transit']['size'] += ['empty']
-       
-                                                 self.empty_load += self.move_over
-                     # Loading Bar
-                     stop_values = list(map(lambda x: floor(x), np.linspace(bl, n - 1, 11)))
-                     if i in stop_values:
-                            prop_done = stop_values.index(i)
-                            print('[' + '###'*prop_done + '   '*(10 - prop_done) + ']' + '  ' + str(prop_done*10) + '% done')
+              """
+              if engine not in ('loop', 'tick', 'event'):
+                     raise ValueError("engine has to be 'loop', 'tick' or 'event', not " + repr(engine))
+              if engine != 'event' and (arrival_events is not None or shift_events is not None):
+                     raise ValueError("arrival_events and shift_events are only for the 'event' engine")
+              if diagnostics:
+                     print('Commencement of Simulation with parameters:\n', 
+                           str(n) + ' Observations with ' + str(headspace) + ' headspace,\n', 
+                           str(bl) + ' Back-log, and\n', 
+                           str(init) + ' for Initialisation')
+              
+              self.start_run(self.prepare_data(df, n, headspace), n, headspace, bl, init, deferred, track_bucket, diagnostics)
+
+              if engine == 'event':
+                     self.run_events(True if arrival_events is None else arrival_events, True if shift_events is None else shift_events)
+              elif engine == 'tick':
+                     self.run_ticks()
+              else:
+                     self.run_loop()
               
+              if deferred:
+                     self.settle_containers()
+
+              if not diagnostics:
+                     return RunSummary(self.container['status'][:n].copy(), self.full_load, self.half_load, self.empty_load)
+
               # to export a .csv file
               print('\nSimulation Complete!')
               print('Exporting Results and Plotting Evaluation...')
               self.export_result()
               self.plot()                                                                       
+
+# Sweep Class
+class Sweep():
+       """
+       This is for running a number of Simulations (one per set of parameters) over the same scenario data
+       in one pass. The scenario data is prepared once, the look ahead at the demand is worked out once for
+       each forward_dd, and the simulations are stepped through the observations together. The containers
+       of all of them are kept in one K x (n + headspace) record. The simulations are run without
+       diagnostics, and should be freshly made.
+       
+       input:        list of the K Simulations
+       """
+       def __init__(self, simulations):
+              self.simulations = list(simulations)
+              self.container = None # K x (n + headspace) record of the containers
+              self.status = None # K x n status codes of the containers
+              self.loads = None # K x 3 full, half and empty load counts
+
+       def __len__(self):
+              return len(self.simulations)
+
+       def run(self, df, n = 1000, headspace = 50, bl = 100, init = 50, deferred = False, engine = 'loop'):
+              """
+              function:     runs all the simulations over the scenario data (see Simulation.simulate_shifting for the inputs)
+              input:        scenario data in the form of a dataframe, number of observations, the amount of headspace, 
+                            back log and initialisation, whether the settling is deferred, and which engine to step
+                            through the observations with; 'loop' or 'tick'
+              output:       list of the RunSummary of each simulation, in order
+              """
+              if engine not in ('loop', 'tick'):
+                     raise ValueError("a sweep runs with the 'loop' or 'tick' engine, not " + repr(engine))
+              simulations = self.simulations
+              data = simulations[0].prepare_data(df, n, headspace)
+              self.container = np.repeat(simulations[0].container_store(n, headspace)[np.newaxis], len(simulations), axis = 0)
+              windows = {}
+              for k, simulation in enumerate(simulations):
+                     simulation.start_run(data, n, headspace, bl, init, deferred, diagnostics = False, container = self.container[k])
+                     # the simulations that look as far ahead share the same look ahead
+                     simulation.demand = windows.setdefault(simulation.forward_dd, simulation.demand)
+
+              edges = simulations[0].tick_edges() if engine == 'tick' else list(range(bl, n + headspace + 1))
+              running = simulations
+              for i, tick_end in zip(edges[:-1], edges[1:]):
+                     # a simulation stops once all its containers have been moved
+                     running = [simulation for simulation in running if simulation.pending_count != 0]
+                     if not running:
+                            break
+                     for simulation in running:
+                            simulation.observe(i, tick_end)
+
+              if deferred:
+                     for simulation in simulations:
+                            simulation.settle_containers()
+
+              self.status = self.container['status'][:, :n]
+              self.loads = np.array([[simulation.full_load, simulation.half_load, simulation.empty_load] for simulation in simulations])
+              return [RunSummary(self.status[k], *self.loads[k].tolist()) for k in range(len(simulations))]